@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Headless bulk voice conversion
+
+Examples:
+    python batch_convert.py --input-dir uploads/ --voice-id JBFqnCBsd6RMkjVDRZzb --report report.json
+    python batch_convert.py --manifest jobs.csv --jobs 4 --api-concurrency 8 --output-dir converted/
+"""
+import sys
+import argparse
+from config import MAX_CONCURRENT_CONVERSIONS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert many audio/video files with ElevenLabs speech-to-speech")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input-dir", help="Directory of audio/video files to convert")
+    source.add_argument("--manifest", help="CSV or JSON file listing input and voice_id per job")
+    parser.add_argument("--voice-id", action="append", default=[],
+                        help="Target voice ID for --input-dir (repeat for several voices)")
+    parser.add_argument("--jobs", type=int, default=2, help="Number of files processed at the same time")
+    parser.add_argument("--api-concurrency", type=int, default=MAX_CONCURRENT_CONVERSIONS,
+                        help="Maximum API requests in flight across all jobs")
+    parser.add_argument("--output-dir", help="Move finished outputs into this directory")
+    parser.add_argument("--report", default="batch_report.json", help="Where to write the JSON results report")
+    args = parser.parse_args(argv)
+    if args.input_dir and not args.voice_id:
+        parser.error("--input-dir requires at least one --voice-id")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Imported here so --help works without the API key and media stack
+    from controllers.batch_controller import discover_inputs, load_job_manifest, build_jobs, run_batch
+
+    if args.manifest:
+        jobs = load_job_manifest(args.manifest)
+    else:
+        jobs = build_jobs(discover_inputs(args.input_dir), args.voice_id)
+    if not jobs:
+        print("No input files found")
+        return 1
+
+    print(f"Running {len(jobs)} job(s), {args.jobs} at a time, up to {args.api_concurrency} API requests in flight")
+    results = run_batch(
+        jobs, job_workers=args.jobs, api_concurrency=args.api_concurrency,
+        output_dir=args.output_dir, report_path=args.report,
+    )
+    failed = sum(1 for r in results if r["status"] != "done")
+    print(f"\n{len(results) - failed} succeeded, {failed} failed. Report written to {args.report}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark: merging converted segments
+
+Compares the old `combined += AudioSegment.from_file(seg)` loop with
+merge_segments (preallocated PCM buffer, single-pass WAV export) for
+10, 100 and 500 segments.
+
+Usage:
+    python benchmarks/bench_merge.py [segment_seconds]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pydub import AudioSegment
+from pydub.generators import Sine
+from models.merge_engine import merge_segments
+
+SEGMENT_COUNTS = (10, 100, 500)
+
+
+def concat_merge(segments, output_path):
+    combined = AudioSegment.empty()
+    for seg in segments:
+        combined += AudioSegment.from_file(seg)
+    combined.export(output_path, format="wav")
+
+
+def write_fixtures(directory, count, segment_seconds):
+    tone = Sine(220).to_audio_segment(duration=segment_seconds * 1000).set_channels(2)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"segment_{i}.wav")
+        tone.export(path, format="wav")
+        paths.append(path)
+    return paths
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    segment_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    print(f"Segments of {segment_seconds}s, 44.1 kHz stereo\n")
+    print(f"{'segments':>8}  {'AudioSegment +=':>16}  {'merge_segments':>15}  {'xfade 50ms':>11}")
+    for count in SEGMENT_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            segments = write_fixtures(tmp, count, segment_seconds)
+            output = os.path.join(tmp, "merged.wav")
+            before = timed(lambda: concat_merge(segments, output))
+            after = timed(lambda: merge_segments(segments, output))
+            crossfaded = timed(lambda: merge_segments(segments, output, crossfade_ms=50))
+        print(f"{count:>8}  {before:>15.2f}s  {after:>14.2f}s  {crossfaded:>10.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of process_voice_change against a local fake API
+
+Generates synthetic speech-like fixtures (tone bursts with pauses and
+occasional long silences) of several lengths, plus a video fixture. It
+then converts each one in a fresh interpreter, pointed at
+benchmarks/fake_elevenlabs.py through ELEVENLABS_BASE_URL. It reports
+wall time, realtime factor, peak RSS and per-stage time.
+
+Save a run with --save and compare later runs against it with
+--baseline; the exit code is 1 if any fixture got slower than the
+tolerance allows, so this can gate a deploy.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--minutes 1,5,20] [--video-minutes 1]
+        [--latency 0.3] [--throughput 0] [--error-rate 0] [--rate-limit-rate 0]
+        [--repeats 1] [--save results.json] [--baseline results.json] [--tolerance 0.2]
+"""
+import os
+import sys
+import json
+import wave
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import numpy as np
+from benchmarks.fake_elevenlabs import FakeElevenLabsServer
+from models.ffmpeg_backend import find_ffmpeg
+
+FRAME_RATE = 44100
+
+
+def synthetic_speech(seconds, channels=2, seed=0):
+    """
+    Int16 samples shaped like speech: 0.2-1.5 s voiced bursts separated by
+    short pauses, with a 3 s silence about every 40 s
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * FRAME_RATE)
+    samples = np.zeros(total, dtype=np.float32)
+    position = 0
+    next_long_pause = 40 * FRAME_RATE
+    while position < total:
+        length = int(rng.uniform(0.2, 1.5) * FRAME_RATE)
+        t = np.arange(min(length, total - position)) / FRAME_RATE
+        pitch = rng.uniform(90, 260)
+        burst = np.sin(2 * np.pi * pitch * t) + 0.4 * np.sin(4 * np.pi * pitch * t) + 0.05 * rng.standard_normal(len(t))
+        samples[position:position + len(t)] = burst * np.hanning(len(t)) * 0.3
+        position += len(t) + int(rng.uniform(0.05, 0.4) * FRAME_RATE)
+        if position > next_long_pause:
+            position += 3 * FRAME_RATE
+            next_long_pause += 40 * FRAME_RATE
+    samples = (samples * 32767).astype(np.int16)
+    return np.repeat(samples[:, None], channels, axis=1)
+
+
+def write_audio_fixture(path, seconds, seed=0):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(FRAME_RATE)
+        # Written in one-minute blocks so long fixtures don't need the whole file in memory
+        for start in range(0, int(seconds), 60):
+            f.writeframes(synthetic_speech(min(60, seconds - start), seed=seed + start).tobytes())
+    return path
+
+
+def write_video_fixture(path, seconds, seed=0):
+    audio_path = write_audio_fixture(path + ".wav", seconds, seed)
+    try:
+        subprocess.run([
+            find_ffmpeg(), "-y", "-v", "error",
+            "-f", "lavfi", "-i", f"testsrc=size=320x240:rate=15:duration={seconds}",
+            "-i", audio_path, "-shortest", "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", path,
+        ], check=True)
+    finally:
+        os.remove(audio_path)
+    return path
+
+
+class QuietStatus:
+    def __getattr__(self, name):
+        return lambda *args: None
+
+
+def run_child(input_path):
+    """Convert one fixture in this (fresh) interpreter and print the result as JSON"""
+    import time
+    import resource
+    from controllers.voice_changer_controller import process_voice_change
+    from models.job_timing import JobTimer
+    from models.media_probe import probe_duration_ms
+
+    timer = JobTimer()
+    start = time.perf_counter()
+    error = None
+    try:
+        output_path, _ = process_voice_change(input_path, {"id": "fake0000000000000000"}, status=QuietStatus(),
+                                              timer=timer)
+        os.remove(output_path)
+    except Exception as e:
+        error = str(e)
+    seconds = time.perf_counter() - start
+    audio_s = probe_duration_ms(input_path) / 1000
+    print(json.dumps({
+        "seconds": round(seconds, 3),
+        "x_realtime": round(audio_s / seconds, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": {stage: totals["seconds"] for stage, totals in timer.summary().items()},
+        "error": error,
+    }))
+
+
+def run_fixture(input_path, server_url, work_dir):
+    env = dict(
+        os.environ,
+        ELEVENLABS_API_KEY="benchmark",
+        ELEVENLABS_BASE_URL=server_url,
+        ELEVENLABS_CACHE_ENABLED="0",
+        ELEVENLABS_JOB_DIR=os.path.join(work_dir, "jobs"),
+        ELEVENLABS_VOICE_CATALOG=os.path.join(work_dir, "voices.json"),
+        ELEVENLABS_METRICS_LOG="",
+        ELEVENLABS_METRICS_PROM="",
+    )
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", input_path],
+                            cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Fixtures whose realtime factor dropped by more than tolerance against the baseline"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("fixtures", {}).get(name)
+        if before and result["x_realtime"] < before["x_realtime"] * (1 - tolerance):
+            regressions.append(f"{name}: {before['x_realtime']}x -> {result['x_realtime']}x realtime")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark process_voice_change against a local fake API")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--minutes", default="1,5,20", help="Comma-separated audio fixture lengths in minutes")
+    parser.add_argument("--video-minutes", default="1", help="Comma-separated video fixture lengths ('' for none)")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake server latency per conversion (s)")
+    parser.add_argument("--throughput", type=float, default=0, help="Fake server response speed in KB/s (0 = unthrottled)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of conversions answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of conversions answered with 429")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per fixture; the median run is reported")
+    parser.add_argument("--save", help="Write the results as JSON, for use as a later --baseline")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed realtime-factor drop vs. baseline")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    server = FakeElevenLabsServer(latency_s=args.latency, throughput_bps=args.throughput * 1000,
+                                  error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate).start()
+    fixtures = [(f"audio_{m}min.wav", float(m), write_audio_fixture) for m in args.minutes.split(",") if m]
+    fixtures += [(f"video_{m}min.mp4", float(m), write_video_fixture) for m in args.video_minutes.split(",") if m]
+
+    print(f"Fake API at {server.url}: latency {args.latency}s, throughput "
+          f"{args.throughput or 'unthrottled'} KB/s, errors {args.error_rate:.0%}, 429s {args.rate_limit_rate:.0%}\n")
+    print(f"{'fixture':<18} {'seconds':>8} {'x realtime':>11} {'peak RSS':>10}  slowest stages")
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name, minutes, write_fixture in fixtures:
+                path = write_fixture(os.path.join(work_dir, name), minutes * 60)
+                runs = [run_fixture(path, server.url, work_dir) for _ in range(args.repeats)]
+                result = sorted(runs, key=lambda r: r["seconds"])[len(runs) // 2]
+                result["seconds_all"] = [r["seconds"] for r in runs]
+                results[name] = result
+                os.remove(path)
+                slowest = sorted(result["stages"].items(), key=lambda item: -item[1])[:3]
+                stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in slowest)
+                if result["error"]:
+                    stages = f"FAILED: {result['error']}"
+                print(f"{name:<18} {result['seconds']:>8.2f} {result['x_realtime']:>10.1f}x "
+                      f"{result['peak_rss_mb']:>7.0f} MB  {stages}")
+    finally:
+        server.stop()
+
+    report = {
+        "settings": {k: v for k, v in vars(args).items() if k not in ("child", "save", "baseline")},
+        "server": server.stats,
+        "median_x_realtime": statistics.median(r["x_realtime"] for r in results.values()) if results else None,
+        "fixtures": results,
+    }
+    print(f"\nFake API: {json.dumps(server.stats)}")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.save}")
+
+    failed = [name for name, r in results.items() if r["error"]]
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
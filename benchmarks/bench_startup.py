@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import time and time-to-first-render
+
+Each measurement runs in a fresh interpreter so nothing is already
+imported. Time-to-first-render executes streamlit_app.py once through
+Streamlit's AppTest harness, which is what a new browser session costs
+on a cold container.
+
+Usage:
+    python benchmarks/bench_startup.py [repeats]
+"""
+import os
+import sys
+import json
+import subprocess
+import statistics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_TARGETS = (
+    "voice_changer",
+    "models.media_processor",
+    "controllers.voice_changer_controller",
+    "run_diagnostic",
+)
+
+IMPORT_SNIPPET = """
+import time, sys
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("moviepy.editor", "pydub", "numpy", "elevenlabs.client", "requests") if m in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+RENDER_SNIPPET = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("streamlit_app.py", default_timeout=120)
+app.run()
+print(time.perf_counter() - start)
+"""
+
+
+def run_snippet(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return result.stdout.strip().splitlines()[-1]
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    results = {}
+    print(f"Median of {repeats} cold runs\n")
+    for module in IMPORT_TARGETS:
+        times, heavy = [], ""
+        for _ in range(repeats):
+            elapsed, _, heavy = run_snippet(IMPORT_SNIPPET.format(module=module)).partition(" ")
+            times.append(float(elapsed))
+        results[f"import {module}"] = statistics.median(times)
+        print(f"import {module:<40} {statistics.median(times) * 1000:8.1f} ms   heavy modules loaded: {heavy or '-'}")
+
+    try:
+        times = [float(run_snippet(RENDER_SNIPPET)) for _ in range(repeats)]
+        results["time to first render"] = statistics.median(times)
+        print(f"{'time to first render (streamlit_app.py)':<47} {statistics.median(times) * 1000:8.1f} ms")
+    except RuntimeError as e:
+        print(f"time to first render: skipped ({e})")
+
+    print("\n" + json.dumps({k: round(v, 4) for k, v in results.items()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: collecting speech-to-speech response chunks
+
+Compares the old `audio_bytes += chunk` loop against write_audio_stream
+for a simulated mp3_44100_128 response (128 kbit/s = 960 KB per minute).
+
+Usage:
+    python benchmarks/bench_stream_sink.py [minutes] [chunk_size]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.stream_sink import write_audio_stream
+
+BYTES_PER_MINUTE = 128 * 1000 // 8 * 60
+
+
+def fake_response(minutes, chunk_size):
+    """Yield chunks the way the SDK generator does"""
+    chunk = b"\xff" * chunk_size
+    remaining = int(BYTES_PER_MINUTE * minutes)
+    while remaining > 0:
+        yield chunk[:min(chunk_size, remaining)]
+        remaining -= chunk_size
+
+
+def concat_to_file(chunks, path):
+    audio_bytes = b''
+    for chunk in chunks:
+        audio_bytes += chunk
+    with open(path, "wb") as f:
+        f.write(audio_bytes)
+
+
+def measure(label, func, minutes):
+    tracemalloc.start()
+    start = time.process_time()
+    func()
+    cpu = time.process_time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} cpu/min: {cpu / minutes * 1000:8.2f} ms   peak mem: {peak / 1024:10.1f} KB")
+
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    print(f"Simulated response: {minutes} min, {chunk_size} byte chunks\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "out.mp3")
+        measure("before: bytes += chunk", lambda: concat_to_file(fake_response(minutes, chunk_size), path), minutes)
+        measure("after: stream to file", lambda: write_audio_stream(fake_response(minutes, chunk_size), path), minutes)
+        measure("after: stream to BytesIO", lambda: write_audio_stream(fake_response(minutes, chunk_size), BytesIO()), minutes)
+
+
+if __name__ == "__main__":
+    main()
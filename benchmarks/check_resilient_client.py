@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Checks of ResilientClient's retries and circuit breaker against injected failures
+
+Each scenario drives a fake speech-to-speech client through a scripted
+sequence of responses (chunks or HTTP errors), with backoff sleeps
+skipped, and checks the outcome of every request. The exit code is 1 if
+any scenario fails.
+
+Usage:
+    python benchmarks/check_resilient_client.py
+"""
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from models.resilient_client import ResilientClient, CircuitOpenError
+
+
+class FakeApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status_code: {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedSpeechToSpeech:
+    """
+    Answers each call with the next scripted response: an HTTP status to fail
+    with, an exception to raise, or None for success
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def convert(self, **kwargs):
+        self.calls += 1
+        response = self.responses.pop(0) if self.responses else None
+        if isinstance(response, Exception):
+            raise response
+        if response is not None:
+            raise FakeApiError(response)
+        return iter([b"audio"])
+
+
+class ScriptedClient:
+    def __init__(self, responses):
+        self.speech_to_speech = ScriptedSpeechToSpeech(responses)
+
+
+def outcome(client):
+    """Result of one conversion: "ok", or the class name of the exception it raised"""
+    try:
+        b"".join(client.speech_to_speech.convert(voice_id="v", audio=None))
+        return "ok"
+    except Exception as e:
+        return type(e).__name__
+
+
+def run(responses, requests, reset_s=0.05, wait_for_reset=True):
+    client = ResilientClient(ScriptedClient(responses), rate=1000, burst=1000, max_retries=0,
+                             failure_threshold=2, reset_s=reset_s, sleep=lambda s: None)
+    results = []
+    for _ in range(requests):
+        results.append(outcome(client))
+        if wait_for_reset:
+            time.sleep(reset_s * 1.5)  # Past the reset window, so an open circuit lets a trial through
+    return results, client
+
+
+def check_opens_after_threshold():
+    results, client = run([503, 503], 3, wait_for_reset=False)
+    return results == ["FakeApiError", "FakeApiError", CircuitOpenError.__name__] \
+        and client.get_metrics()["circuit_open"]
+
+
+def check_closes_after_successful_trial():
+    results, client = run([503, 503], 3)
+    return results == ["FakeApiError", "FakeApiError", "ok"] and not client.get_metrics()["circuit_open"]
+
+
+def check_failed_trial_reopens():
+    results, _ = run([503, 503, 503], 4)
+    return results == ["FakeApiError", "FakeApiError", "FakeApiError", "ok"]
+
+
+def check_invalid_trial_request_frees_the_trial():
+    # A trial rejected as invalid (422) says nothing about the API; the next request must still get through
+    results, client = run([503, 503, 422], 5)
+    return results == ["FakeApiError", "FakeApiError", "FakeApiError", "ok", "ok"] \
+        and not client.get_metrics()["circuit_open"]
+
+
+def check_retries_transient_errors():
+    client = ResilientClient(ScriptedClient([429, 503]), rate=1000, burst=1000, max_retries=2,
+                             failure_threshold=5, sleep=lambda s: None)
+    metrics_ok = lambda m: m["retries"] == 2 and m["rate_limited"] == 1
+    return outcome(client) == "ok" and metrics_ok(client.get_metrics())
+
+
+def check_retries_dropped_connections():
+    # The SDK's HTTP client raises httpx errors, not builtin ConnectionError or TimeoutError
+    import httpx
+    client = ResilientClient(ScriptedClient([httpx.ConnectError("Connection refused"), httpx.ReadTimeout("timed out")]),
+                             rate=1000, burst=1000, max_retries=2, failure_threshold=5, sleep=lambda s: None)
+    return outcome(client) == "ok" and client.get_metrics()["retries"] == 2
+
+
+CHECKS = [
+    check_opens_after_threshold,
+    check_closes_after_successful_trial,
+    check_failed_trial_reopens,
+    check_invalid_trial_request_frees_the_trial,
+    check_retries_transient_errors,
+    check_retries_dropped_connections,
+]
+
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        passed = check()
+        failed += not passed
+        print(f"{'ok  ' if passed else 'FAIL'} {check.__name__}")
+    print(f"\n{len(CHECKS) - failed} passed, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the ElevenLabs speech-to-speech and voices endpoints
+
+Speech-to-speech echoes the uploaded audio back (so the rest of the
+pipeline decodes and merges real audio), after a configurable latency,
+streamed at a configurable throughput. A configurable share of requests
+fail with 429 or 503 to exercise retries.
+
+Point the app at it with ELEVENLABS_BASE_URL, e.g.:
+    python benchmarks/fake_elevenlabs.py --port 8765 --latency 0.5
+    ELEVENLABS_BASE_URL=http://127.0.0.1:8765 streamlit run streamlit_app.py
+"""
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHUNK_SIZE = 16 * 1024
+
+VOICE_NAMES = ("Rachel", "Domi", "Bella", "Antoni", "Josh", "Nicole", "Adam", "Sam")
+
+
+def fake_voices(count):
+    voices = []
+    for i in range(count):
+        name = VOICE_NAMES[i % len(VOICE_NAMES)] + ("" if i < len(VOICE_NAMES) else f" {i // len(VOICE_NAMES)}")
+        voices.append({
+            "voice_id": f"fake{i:016d}",
+            "name": name,
+            "category": "premade",
+            "preview_url": "",
+            "labels": {"accent": "american", "gender": "female" if i % 2 else "male", "age": "young",
+                       "description": "synthetic", "use_case": "benchmark"},
+        })
+    return voices
+
+
+def multipart_file(body, content_type):
+    """Bytes of the first file part of a multipart/form-data body"""
+    match = re.search(r'boundary="?([^";]+)"?', content_type or "")
+    if not match:
+        return body
+    for part in body.split(b"--" + match.group(1).encode()):
+        headers, sep, content = part.partition(b"\r\n\r\n")
+        if sep and b"filename=" in headers:
+            return content[:-2] if content.endswith(b"\r\n") else content
+    return b""
+
+
+class FakeElevenLabsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split("?")[0]
+        if path == "/v2/voices":
+            etag = server.voices_etag
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send_json(200, {"voices": server.voices, "has_more": False, "total_count": len(server.voices),
+                                  "next_page_token": None}, {"ETag": etag})
+        elif path == "/v1/voices":
+            self._send_json(200, {"voices": server.voices})
+        elif path == "/v1/user":
+            self._send_json(200, {"subscription": {"tier": "benchmark", "voice_conversion_remaining": 10 ** 6}})
+        else:
+            self._send_json(404, {"detail": f"Not found: {path}"})
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.startswith("/v1/speech-to-speech/"):
+            self._send_json(404, {"detail": f"Not found: {self.path}"})
+            return
+        server.count("requests", bytes_in=len(body))
+
+        roll = server.random()
+        if roll < server.rate_limit_rate:
+            server.count("rate_limited")
+            self._send_json(429, {"detail": {"status": "too_many_concurrent_requests"}}, {"Retry-After": "0"})
+            return
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.count("errors")
+            self._send_json(503, {"detail": "Service temporarily unavailable"})
+            return
+
+        audio = multipart_file(body, self.headers.get("Content-Type"))
+        time.sleep(server.latency_s)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(audio)))
+        self.end_headers()
+        for i in range(0, len(audio), CHUNK_SIZE):
+            chunk = audio[i:i + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            if server.throughput_bps:
+                time.sleep(len(chunk) / server.throughput_bps)
+        server.count("bytes_out", len(audio))
+
+
+class FakeElevenLabsServer(ThreadingHTTPServer):
+    """
+    Threaded fake API server; start() runs it in a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        latency_s: Delay before a speech-to-speech response starts
+        throughput_bps: Response streaming speed in bytes/s (0 = unthrottled)
+        error_rate: Share of speech-to-speech requests answered with 503
+        rate_limit_rate: Share answered with 429
+        voice_count: Number of voices listed
+        seed: Seed for the error rolls, so runs are reproducible
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency_s=0.0, throughput_bps=0, error_rate=0.0, rate_limit_rate=0.0,
+                 voice_count=24, seed=0):
+        super().__init__(("127.0.0.1", port), FakeElevenLabsHandler)
+        self.latency_s = latency_s
+        self.throughput_bps = throughput_bps
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.voices = fake_voices(voice_count)
+        self.voices_etag = '"' + hashlib.sha256(json.dumps(self.voices).encode()).hexdigest()[:16] + '"'
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0}
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def count(self, key, amount=1, bytes_in=0):
+        with self._lock:
+            self.stats[key] += amount
+            self.stats["bytes_in"] += bytes_in
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the ElevenLabs API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each conversion response starts")
+    parser.add_argument("--throughput", type=float, default=0, help="Response speed in KB/s (0 = unthrottled)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of conversions answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of conversions answered with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = FakeElevenLabsServer(args.port, args.latency, args.throughput * 1000, args.error_rate,
+                                  args.rate_limit_rate, seed=args.seed)
+    print(f"Fake ElevenLabs API listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
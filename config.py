@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -7,10 +8,101 @@ load_dotenv()
 # Eleven Labs API configuration
 ELEVEN_LABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
 ELEVEN_LABS_API_URL = "https://api.elevenlabs.io/v1"
+# Host the SDK talks to; point it at a stand-in server (see benchmarks/fake_elevenlabs.py) to run offline
+ELEVEN_LABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
 
 # Audio processing settings
 MAX_SEGMENT_DURATION_MS = 1 * 60 * 1000  # 4 minutes in milliseconds
 MAX_API_DURATION_MS = 5 * 60 * 1000      # 5 minutes in milliseconds
 
+# Silence-aware segmentation: cut at the quietest point within the tolerance window
+# before each MAX_SEGMENT_DURATION_MS boundary, and skip long silences entirely
+SILENCE_AWARE_SEGMENTS = os.getenv("ELEVENLABS_SILENCE_AWARE_SEGMENTS", "1") not in ("0", "false", "False", "")
+SEGMENT_CUT_TOLERANCE_MS = 10 * 1000
+SILENCE_THRESHOLD_DB = -45.0
+MIN_SKIPPED_SILENCE_MS = 2 * 1000
+
+# Overlap between adjacent segments, crossfaded when merging (0 = butt-joined)
+SEGMENT_CROSSFADE_MS = int(os.getenv("ELEVENLABS_SEGMENT_CROSSFADE_MS", "0"))
+
+# How segments are encoded for upload: wav, mp3, opus or flac. Speech-to-speech
+# doesn't need CD-quality PCM, and upload time dominates on slow links.
+UPLOAD_FORMAT = os.getenv("ELEVENLABS_UPLOAD_FORMAT", "mp3").lower()
+UPLOAD_SAMPLE_RATE = int(os.getenv("ELEVENLABS_UPLOAD_SAMPLE_RATE", "24000"))  # 0 keeps the source rate
+UPLOAD_CHANNELS = int(os.getenv("ELEVENLABS_UPLOAD_CHANNELS", "1"))  # 0 keeps the source channels
+UPLOAD_BITRATE = os.getenv("ELEVENLABS_UPLOAD_BITRATE", "64k")  # mp3 and opus only
+
+# Memory a job may use for decoded audio. Inputs whose decoded input and output
+# wouldn't fit are decoded to a temporary file and read, and merged, in windows.
+MEMORY_BUDGET_MB = int(os.getenv("ELEVENLABS_MEMORY_BUDGET_MB", "1024"))
+
+# Worker processes for CPU-bound encoding and decoding of segments (0 = one per
+# CPU core, 1 = encode and decode in the app's own process). Workers are spawned,
+# so scripts that run conversions need an `if __name__ == "__main__":` guard.
+MEDIA_WORKERS = int(os.getenv("ELEVENLABS_MEDIA_WORKERS", "0"))
+
+# Preview mode: length of the excerpt converted, and how much of the input is
+# scanned for the most speech-dense stretch
+PREVIEW_DURATION_MS = int(float(os.getenv("ELEVENLABS_PREVIEW_SECONDS", "15")) * 1000)
+PREVIEW_SCAN_MS = 10 * 60 * 1000
+
+# Number of segments sent to the speech-to-speech API at the same time
+MAX_CONCURRENT_CONVERSIONS = int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", "4"))
+
+# Conversion jobs run in the background at the same time (in the web UI), all
+# sharing the MAX_CONCURRENT_CONVERSIONS API slots. Finished jobs stay listed
+# for JOB_HISTORY_S.
+MAX_CONCURRENT_JOBS = int(os.getenv("ELEVENLABS_MAX_JOBS", "2"))
+JOB_HISTORY_S = 60 * 60
+
+# Speech-to-speech request pacing and retries (shared by all concurrent callers)
+API_RATE_LIMIT_PER_S = float(os.getenv("ELEVENLABS_RATE_LIMIT_PER_S", "5"))
+API_RATE_BURST = int(os.getenv("ELEVENLABS_RATE_BURST", "5"))
+API_MAX_RETRIES = int(os.getenv("ELEVENLABS_MAX_RETRIES", "4"))
+API_BACKOFF_BASE_S = 1.0
+API_BACKOFF_MAX_S = 30.0
+API_CIRCUIT_FAILURE_THRESHOLD = 5   # consecutive transient failures before pausing requests
+API_CIRCUIT_RESET_S = 30.0
+
+# HTTP connection pool shared by every API call in the process
+API_POOL_SIZE = int(os.getenv("ELEVENLABS_POOL_SIZE", "16"))
+API_TIMEOUT_S = float(os.getenv("ELEVENLABS_TIMEOUT_S", "240"))
+API_CONNECT_TIMEOUT_S = float(os.getenv("ELEVENLABS_CONNECT_TIMEOUT_S", "10"))
+API_KEEPALIVE_EXPIRY_S = 60.0
+
+# Local copy of the account's voice list, refreshed in the background once older than this
+VOICE_CATALOG_PATH = os.path.expanduser(os.getenv("ELEVENLABS_VOICE_CATALOG", os.path.join("~", ".cache", "elevenlabs-gui", "voices.json")))
+VOICE_CATALOG_MAX_AGE_S = int(os.getenv("ELEVENLABS_VOICE_CATALOG_MAX_AGE_S", "3600"))
+
+# On-disk cache of converted segments, so retries and re-runs don't pay for the same audio twice
+CONVERSION_CACHE_ENABLED = os.getenv("ELEVENLABS_CACHE_ENABLED", "1") not in ("0", "false", "False", "")
+CONVERSION_CACHE_DIR = os.path.expanduser(os.getenv("ELEVENLABS_CACHE_DIR", os.path.join("~", ".cache", "elevenlabs-gui", "conversions")))
+CONVERSION_CACHE_MAX_BYTES = int(os.getenv("ELEVENLABS_CACHE_MAX_MB", "2048")) * 1024 * 1024
+CONVERSION_CACHE_MAX_AGE_S = int(os.getenv("ELEVENLABS_CACHE_MAX_AGE_DAYS", "7")) * 24 * 60 * 60
+
+# Checkpointed job state (manifest + converted segments) so failed jobs can resume
+JOB_WORK_DIR = os.path.expanduser(os.getenv("ELEVENLABS_JOB_DIR", os.path.join(tempfile.gettempdir(), "elevenlabs-gui-jobs")))
+
+# Disk space all jobs together may use under JOB_WORK_DIR (uploads, scratch files,
+# outputs and checkpoints); jobs that wouldn't fit are turned away. 0 = no limit.
+DISK_QUOTA_BYTES = int(os.getenv("ELEVENLABS_DISK_QUOTA_MB", "10240")) * 1024 * 1024
+# Checkpoints of failed or cancelled jobs are removed once not resumed for this long
+CHECKPOINT_MAX_AGE_S = int(float(os.getenv("ELEVENLABS_CHECKPOINT_MAX_AGE_H", "24")) * 60 * 60)
+
+# Per-stage job timings: JSON lines appended per job, and Prometheus counters
+# rewritten after each job (e.g. for node_exporter's textfile collector). Empty = off.
+METRICS_LOG_PATH = os.path.expanduser(os.getenv("ELEVENLABS_METRICS_LOG", ""))
+METRICS_PROM_PATH = os.path.expanduser(os.getenv("ELEVENLABS_METRICS_PROM", ""))
+
+# Admission control: jobs are checked against the account's remaining
+# speech-to-speech quota (QUOTA_UNITS_PER_MIN quota units per minute of audio,
+# re-read every QUOTA_CACHE_S) and against spending budgets in dollars (0 = no
+# limit). Jobs that only partly fit convert what fits; a rerun does the rest.
+QUOTA_UNITS_PER_MIN = float(os.getenv("ELEVENLABS_QUOTA_UNITS_PER_MIN", "1000"))
+QUOTA_CACHE_S = 5 * 60
+JOB_BUDGET_USD = float(os.getenv("ELEVENLABS_JOB_BUDGET", "0"))
+DAILY_BUDGET_USD = float(os.getenv("ELEVENLABS_DAILY_BUDGET", "0"))
+SPEND_LEDGER_PATH = os.path.expanduser(os.getenv("ELEVENLABS_SPEND_LEDGER", os.path.join("~", ".cache", "elevenlabs-gui", "spend.json")))
+
 # Default voice pricing
 DEFAULT_VOICE_PRICE_PER_MIN = 0.20
@@ -0,0 +1,205 @@
+import os
+import csv
+import json
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from controllers import voice_changer_controller
+from controllers.voice_changer_controller import process_voice_changes
+from models.job_timing import JobTimer
+from models.job_manifest import file_sha256, claim_checkpoints, release_checkpoints
+from config import MAX_CONCURRENT_CONVERSIONS
+
+# File types accepted by the Streamlit uploader
+MEDIA_EXTENSIONS = (".wav", ".mp3", ".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv")
+
+
+class PrintStatus:
+    """Progress reporter for headless runs; mirrors the st.info/write/warning/error calls"""
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+
+    def _print(self, level, message):
+        print(f"{self.prefix}{level}{message}", flush=True)
+
+    def info(self, message):
+        self._print("", message)
+
+    def write(self, message):
+        self._print("", message)
+
+    def warning(self, message):
+        self._print("WARNING: ", message)
+
+    def error(self, message):
+        self._print("ERROR: ", message)
+
+
+def discover_inputs(directory):
+    """All supported media files directly inside directory, sorted by name"""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(MEDIA_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def load_job_manifest(path):
+    """
+    Read batch jobs from a CSV or JSON file
+
+    CSV needs `input` and `voice_id` columns (plus an optional `price_per_min`);
+    JSON is a list of objects with the same keys. Relative input paths are
+    resolved against the manifest's directory.
+    """
+    with open(path, newline="") as f:
+        if path.lower().endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for row in rows:
+        voice = {"id": row["voice_id"]}
+        if row.get("price_per_min") not in (None, ""):
+            voice["price_per_min"] = float(row["price_per_min"])
+        jobs.append({"input": os.path.join(base_dir, row["input"]), "voice": voice})
+    return jobs
+
+
+def build_jobs(inputs, voice_ids):
+    """One job per (input, voice) pair"""
+    return [{"input": path, "voice": {"id": voice_id}} for path in inputs for voice_id in voice_ids]
+
+
+def group_jobs(jobs):
+    """
+    Merge (input, voice) jobs into one job per input with all of its voices
+
+    Duplicates are dropped: converting the same input to the same voice
+    twice would share one work directory. Identical files at different
+    paths share it too; run_job serializes those.
+    """
+    grouped = {}
+    for job in jobs:
+        group = grouped.setdefault(os.path.abspath(job["input"]), {"input": job["input"], "voices": []})
+        if all(voice["id"] != job["voice"]["id"] for voice in group["voices"]):
+            group["voices"].append(job["voice"])
+    return list(grouped.values())
+
+
+def run_job(job, api_slots, segment_workers, output_dir=None):
+    """
+    Convert one input into each of its voices (decoded and segmented once)
+
+    Returns:
+        One result record per voice (never raises)
+    """
+    name = os.path.basename(job["input"])
+    voice_ids = [voice["id"] for voice in job["voices"]]
+    records = {voice_id: {"input": job["input"], "voice_id": voice_id, "status": "failed", "output": None, "cost": 0,
+                          "seconds": 0.0, "error": None, "upload_bytes_per_min": None, "stage_seconds": {}}
+               for voice_id in voice_ids}
+    stats = {}
+    timer = JobTimer()
+    start_time = time.time()
+    status = PrintStatus(f"[{name} -> {', '.join(voice_ids)}] ")
+    keys = set()
+    try:
+        # Checkpoints are keyed by content, so a copy of a file running under
+        # another path with the same voice has to finish first
+        input_hash = file_sha256(job["input"])
+        keys = {(input_hash, voice_id) for voice_id in voice_ids}
+        claim_checkpoints(keys, on_wait=lambda: status.info(
+            "Waiting for a job converting an identical file into the same voice..."))
+        results = process_voice_changes(
+            job["input"], job["voices"], max_workers=segment_workers, status=status, api_slots=api_slots,
+            stats=stats, timer=timer, input_hash=input_hash,
+        )
+        for voice_id, result in results.items():
+            output_path = result["output"]
+            if result["error"]:
+                records[voice_id]["error"] = result["error"]
+                continue
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+                moved_path = os.path.join(output_dir, os.path.basename(output_path))
+                shutil.move(output_path, moved_path)
+                output_path = moved_path
+            records[voice_id].update(status="done", output=output_path, cost=result["cost"])
+    except Exception as e:
+        for record in records.values():
+            record["error"] = str(e)
+    finally:
+        release_checkpoints(keys)
+    stage_seconds = {stage: totals["seconds"] for stage, totals in timer.summary().items()}
+    for record in records.values():
+        record["upload_bytes_per_min"] = stats.get("upload_bytes_per_min")
+        record["stage_seconds"] = stage_seconds
+        record["seconds"] = round(time.time() - start_time, 2)
+    return [records[voice_id] for voice_id in voice_ids]
+
+
+def run_batch(jobs, job_workers=2, api_concurrency=MAX_CONCURRENT_CONVERSIONS, segment_workers=None,
+              output_dir=None, report_path=None):
+    """
+    Run many conversion jobs across a worker pool
+
+    Jobs for the same input are run as one multi-voice job, so the input is
+    decoded, segmented and encoded once however many voices it goes to.
+
+    Args:
+        jobs: List of {"input": path, "voice": voice_option} dicts
+        job_workers: Number of inputs processed at the same time
+        api_concurrency: Global cap on in-flight API requests across all jobs
+        segment_workers: Per-job segment concurrency (defaults to api_concurrency)
+        output_dir: Optional directory to move finished outputs into
+        report_path: Optional path of the JSON results report
+
+    Returns:
+        List of result records (input, voice_id, status, output, cost, seconds, error,
+        upload_bytes_per_min, stage_seconds), grouped by input in the order of jobs
+    """
+    grouped_jobs = group_jobs(jobs)
+    api_slots = threading.BoundedSemaphore(api_concurrency)
+    segment_workers = segment_workers or api_concurrency
+    results = [None] * len(grouped_jobs)
+    batch_start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, job_workers)) as executor:
+        futures = {
+            executor.submit(run_job, job, api_slots, segment_workers, output_dir): i
+            for i, job in enumerate(grouped_jobs)
+        }
+        for future in as_completed(futures):
+            records = future.result()
+            results[futures[future]] = records
+            for record in records:
+                print(f"{record['status'].upper()}: {record['input']} -> {record['voice_id']} "
+                      f"({record['seconds']}s, ${record['cost']})" + (f" {record['error']}" if record["error"] else ""),
+                      flush=True)
+
+    results = [record for records in results for record in records]
+    if report_path:
+        write_report(results, report_path, time.time() - batch_start,
+                     voice_changer_controller.voice_changer.get_metrics())
+    return results
+
+
+def write_report(results, report_path, elapsed_seconds, metrics=None):
+    """Write batch results and totals as JSON, with the API client's and cache's metrics if given"""
+    done = [r for r in results if r["status"] == "done"]
+    report = {
+        "jobs": len(results),
+        "succeeded": len(done),
+        "failed": len(results) - len(done),
+        "total_cost": round(sum(r["cost"] for r in done), 2),
+        "elapsed_seconds": round(elapsed_seconds, 2),
+        "api": (metrics or {}).get("api"),
+        "cache": (metrics or {}).get("cache"),
+        "results": results,
+    }
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
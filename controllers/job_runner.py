@@ -0,0 +1,243 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from controllers.voice_changer_controller import process_voice_changes, estimate_scratch_bytes, JobCancelled
+from models.admission import get_admission_controller, AdmissionRejected
+from models.job_timing import JobTimer
+from models.job_manifest import file_sha256, claim_checkpoints, release_checkpoints
+from models.workspace import Workspace, prune_stale
+from config import MAX_CONCURRENT_JOBS, MAX_CONCURRENT_CONVERSIONS, JOB_HISTORY_S, CHECKPOINT_MAX_AGE_S
+
+# Messages kept per job for display
+MAX_MESSAGES = 200
+
+# Every background job in the process shares these API slots, so running
+# several jobs splits the API concurrency instead of multiplying it
+_api_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CONVERSIONS)
+_executor = None
+_jobs = {}
+_lock = threading.Lock()
+
+
+class JobStatus:
+    """
+    Live state of one background job, and its progress reporter
+
+    process_voice_changes calls info/write/warning/error/progress on it from
+    the worker thread; the UI reads it through snapshot(), from any thread.
+    """
+
+    def __init__(self, job_id, workspace, input_path, voice_options, timer=None, max_workers=None):
+        self.job_id = job_id
+        self.workspace = workspace
+        self.input_path = input_path
+        self.voice_options = voice_options
+        self.max_workers = max_workers
+        self.timer = timer if timer is not None else JobTimer()
+        self.cancel_event = threading.Event()
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.finished = 0
+        self.total = 0
+        self.upload_bytes = 0
+        self.messages = []
+        self.results = None
+        self.error_message = None
+        self._progress_start = None
+        self._lock = threading.Lock()
+
+    def _log(self, level, message):
+        with self._lock:
+            self.messages.append((level, message))
+            del self.messages[:-MAX_MESSAGES]
+
+    def info(self, message):
+        self._log("info", message)
+
+    def write(self, message):
+        self._log("write", message)
+
+    def warning(self, message):
+        self._log("warning", message)
+
+    def error(self, message):
+        self._log("error", message)
+
+    def progress(self, finished, total, upload_bytes):
+        """Conversion requests finished so far out of total, and bytes sent for them"""
+        with self._lock:
+            if self._progress_start is None:
+                self._progress_start = time.perf_counter()
+            self.finished = finished
+            self.total = total
+            self.upload_bytes = upload_bytes
+
+    def _eta_seconds(self):
+        # Extrapolated from the conversion rate so far; decoding and merging aren't included
+        if not self.finished or self._progress_start is None or self.state != "running":
+            return None
+        elapsed = time.perf_counter() - self._progress_start
+        return round(elapsed / self.finished * (self.total - self.finished), 1)
+
+    def _finish(self, state, results=None, error_message=None):
+        with self._lock:
+            self.state = state
+            self.results = results
+            self.error_message = error_message
+            self.finished_at = time.time()
+
+    def snapshot(self):
+        """Consistent copy of the job's state for display"""
+        with self._lock:
+            return {
+                "id": self.job_id,
+                "state": self.state,
+                "input": self.input_path,
+                "voice_ids": [option["id"] for option in self.voice_options],
+                "finished": self.finished,
+                "total": self.total,
+                "upload_bytes": self.upload_bytes,
+                "eta_s": self._eta_seconds(),
+                "cancel_requested": self.cancel_event.is_set(),
+                "messages": list(self.messages),
+                "results": self.results,
+                "error": self.error_message,
+                "submitted_at": self.submitted_at,
+                "finished_at": self.finished_at,
+                "timer": self.timer,
+            }
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, MAX_CONCURRENT_JOBS), thread_name_prefix="voice-job")
+        return _executor
+
+
+def _run(job):
+    if job.cancel_event.is_set():
+        job._finish("cancelled", error_message="Cancelled before it started")
+        job.workspace.cleanup()
+        return
+    with job._lock:
+        job.state = "running"
+    keys = set()
+    outputs = []
+    try:
+        input_hash = file_sha256(job.input_path)
+        keys = {(input_hash, option["id"]) for option in job.voice_options}
+        # Jobs with the same input and voice share a checkpoint, so a second one waits for the first
+        if not claim_checkpoints(keys, job.cancel_event, lambda: job.info(
+                "Waiting for another job converting this file into the same voice...")):
+            keys = set()  # Still held by the other job
+            raise JobCancelled("Cancelled before it started")
+        results = process_voice_changes(job.input_path, job.voice_options, max_workers=job.max_workers, status=job,
+                                        api_slots=_api_slots, timer=job.timer, cancel=job.cancel_event,
+                                        workspace=job.workspace, input_hash=input_hash)
+        outputs = [result["output"] for result in results.values()]
+    except JobCancelled as e:
+        job._finish("cancelled", error_message=str(e))
+    except AdmissionRejected as e:
+        job._finish("rejected", error_message=str(e))
+    except Exception as e:
+        job._finish("failed", error_message=str(e))
+    else:
+        failed = [result for result in results.values() if result["error"]]
+        state = "failed" if len(failed) == len(results) else "partial" if failed else "done"
+        job._finish(state, results, failed[0]["error"] if len(failed) == len(results) else None)
+    finally:
+        release_checkpoints(keys)
+        # Only the outputs stay (until the job is pruned); the input copy and every intermediate file go now
+        job.workspace.cleanup(keep=outputs)
+
+
+def _prune_finished():
+    """
+    Forget jobs that finished more than JOB_HISTORY_S ago and remove their
+    outputs, along with anything older left behind by earlier processes
+    """
+    cutoff = time.time() - JOB_HISTORY_S
+    with _lock:
+        expired = [job for job in _jobs.values() if job.finished_at and job.finished_at < cutoff]
+        for job in expired:
+            del _jobs[job.job_id]
+    for job in expired:
+        job.workspace.cleanup()
+    prune_stale(JOB_HISTORY_S, CHECKPOINT_MAX_AGE_S)
+
+
+def submit_job(input_path, voice_options, timer=None, max_workers=None):
+    """
+    Queue a conversion job to run in the background
+
+    The job gets its own Workspace, admitted against the disk quota with an
+    estimate of the space it needs. The input is linked (or copied) into
+    it, so the caller's copy can go away while the job runs; its scratch
+    files and outputs are written there too. A job converting the same
+    input into a voice that a running job is converting it into waits for
+    that job, since the two would share a checkpoint.
+
+    Args:
+        input_path: Audio or video file to convert
+        voice_options: Voice dicts with at least "id" (and optionally "price_per_min")
+        timer: Optional JobTimer, e.g. already holding the probe span
+        max_workers: Concurrent segment conversions for this job (defaults to config)
+
+    Returns:
+        The job ID, for get_job and cancel_job
+
+    Raises:
+        DiskQuotaExceeded: if the job doesn't fit in the disk quota right now
+        AdmissionRejected: if there's no conversion quota or budget left at all
+    """
+    _prune_finished()
+    get_admission_controller().preflight()
+    voice_options = list(voice_options)
+    job_id = uuid.uuid4().hex[:12]
+    workspace = Workspace(job_id)
+    try:
+        workspace.reserve(estimate_scratch_bytes(input_path, len(voice_options)))
+        job_input = workspace.add_file(input_path)
+    except Exception:
+        workspace.cleanup()
+        raise
+
+    job = JobStatus(job_id, workspace, job_input, voice_options, timer, max_workers)
+    with _lock:
+        _jobs[job_id] = job
+    _get_executor().submit(_run, job)
+    return job_id
+
+
+def get_job(job_id):
+    """Snapshot of a job's state, or None if it's unknown (or was pruned)"""
+    with _lock:
+        job = _jobs.get(job_id)
+    return job.snapshot() if job else None
+
+
+def list_jobs():
+    """Snapshots of all known jobs, newest first"""
+    with _lock:
+        jobs = list(_jobs.values())
+    return sorted((job.snapshot() for job in jobs), key=lambda job: -job["submitted_at"])
+
+
+def cancel_job(job_id):
+    """
+    Ask a job to stop; queued jobs never start, running ones stop sending new
+    segments and finish the requests already in flight
+
+    Returns:
+        True if the job was still queued or running
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None or job.finished_at:
+        return False
+    job.cancel_event.set()
+    return True
@@ -1,63 +1,627 @@
 import os
-import math
-import streamlit as st
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from voice_changer import VoiceChanger
-from models.media_processor import segment_media, merge_audio, is_video_file, replace_video_audio
-from config import MAX_SEGMENT_DURATION_MS  # Import configuration value
+from models.media_processor import (
+    load_audio, extract_audio_from_video, plan_segments, split_audio,
+    is_video_file, replace_video_audio, load_excerpt, encode_audio,
+)
+from models.job_manifest import JobManifest, file_sha256
+from models.job_timing import JobTimer
+from models.workspace import Workspace
+from models.media_pool import get_media_pool
+from models.admission import get_admission_controller, AdmissionRejected
+from models.media_probe import probe_media, MediaProbeError
+from config import MAX_SEGMENT_DURATION_MS, MAX_CONCURRENT_CONVERSIONS, JOB_WORK_DIR, SEGMENT_CROSSFADE_MS  # Import configuration value
+from config import UPLOAD_FORMAT, UPLOAD_SAMPLE_RATE, UPLOAD_CHANNELS, UPLOAD_BITRATE, MEMORY_BUDGET_MB
+from config import PREVIEW_DURATION_MS
 
 # Initialize the voice changer
 voice_changer = VoiceChanger()
 
-def process_voice_change(input_file_path, voice_option):
+
+class SegmentConversionError(Exception):
+    """Raised when one or more segments could not be converted"""
+
+    def __init__(self, failures, results):
+        # failures: list of (segment_index, error_message), sorted by index
+        # results: per-segment output paths in segment order (None where failed)
+        self.failures = failures
+        self.results = results
+        details = "; ".join(f"segment {i+1}: {error}" for i, error in failures)
+        super().__init__(f"{len(failures)} of {len(results)} segments failed ({details})")
+
+
+class JobCancelled(Exception):
+    """Raised when a job is cancelled; segments converted so far are kept for a rerun"""
+
+
+def _convert_one(changer, segment, voice_id, api_slots=None, timer=None, index=None, work_dir=None,
+                 before_api_call=None):
+    """Convert a single segment, holding one of the shared API slots if given"""
+    if isinstance(segment, str):
+        kwargs = {"input_audio_path": segment}
+    else:
+        kwargs = {"input_audio_data": segment}
+    if timer is not None:
+        kwargs.update(timer=timer, segment=index)
+    if work_dir is not None:
+        kwargs.update(work_dir=work_dir)
+    if before_api_call is not None:
+        kwargs.update(before_api_call=lambda: before_api_call(index, voice_id))
+    if api_slots is None:
+        return changer.change_voice(voice_id=voice_id, **kwargs)
+    with api_slots:
+        return changer.change_voice(voice_id=voice_id, **kwargs)
+
+
+def iter_converted_segments(segments, voice_id, max_workers=None, changer=None, api_slots=None, max_in_flight=None,
+                            timer=None, cancel=None, work_dir=None, before_api_call=None):
+    """
+    Convert segments as they are produced, yielding results as they finish
+
+    Segments are pulled from the iterable only while fewer than
+    max_in_flight are submitted, so a lazy producer (e.g. split_audio)
+    encodes the next segment while earlier ones are uploading, and no
+    more than max_in_flight encoded segments are held at once.
+
+    Args:
+        segments: Iterable of (index, segment) pairs, or (index, segment, voice_id)
+            triples to send the segment to a voice other than voice_id;
+            segment is a file path or an in-memory buffer
+        voice_id: Default target voice ID
+        max_workers: Maximum number of concurrent API requests (defaults to config)
+        changer: VoiceChanger to use (defaults to the module-level instance)
+        api_slots: Optional semaphore shared between jobs to cap the total
+            number of in-flight API requests across all of them
+        max_in_flight: Segments submitted but not yet finished (defaults to
+            twice max_workers, so workers never wait on the producer)
+        timer: Optional JobTimer that gets each request's upload, server and download spans
+        cancel: Optional threading.Event; once set, no more segments are pulled,
+            queued requests are dropped, and only those already running finish
+        work_dir: Directory the converted files are downloaded into (default:
+            the system temp directory)
+        before_api_call: Optional callable(index, voice_id) run just before a
+            segment that isn't in the conversion cache is sent; if it returns
+            False, the segment isn't sent and fails
+
+    Yields:
+        (index, voice_id, success, result) in completion order
+    """
+    changer = changer or voice_changer
+    max_workers = max(1, max_workers or MAX_CONCURRENT_CONVERSIONS)
+    max_in_flight = max(max_workers, max_in_flight or 2 * max_workers)
+    segments = iter(segments)
+    exhausted = False
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            if cancel is not None and cancel.is_set():
+                exhausted = True
+                for future in [future for future in in_flight if future.cancel()]:
+                    del in_flight[future]
+            while not exhausted and len(in_flight) < max_in_flight:
+                try:
+                    item = next(segments)
+                except StopIteration:
+                    exhausted = True
+                    break
+                index, segment, target = item if len(item) == 3 else (item[0], item[1], voice_id)
+                future = executor.submit(_convert_one, changer, segment, target, api_slots, timer, index, work_dir,
+                                         before_api_call)
+                in_flight[future] = (index, target)
+            if not in_flight:
+                return
+            # With a cancel event, wake up now and then to check it
+            done, _ = wait(in_flight, timeout=0.5 if cancel is not None else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, target = in_flight.pop(future)
+                try:
+                    success, result = future.result()
+                except Exception as e:
+                    success, result = False, str(e)
+                yield index, target, success, result
+
+
+def convert_segments(segments, voice_id, max_workers=None, changer=None, on_segment_done=None, indices=None, api_slots=None):
+    """
+    Convert segments concurrently with a bounded worker pool
+
+    Args:
+        segments: Segment file paths or in-memory buffers, in playback order
+        voice_id: Target voice ID
+        max_workers: Maximum number of in-flight API requests (defaults to config)
+        changer: VoiceChanger to use (defaults to the module-level instance)
+        on_segment_done: Optional callback(index, success, result), called from
+            the calling thread as each segment finishes
+        indices: Optional segment numbers for each entry of segments, used in
+            callbacks and failures (defaults to 0..len(segments)-1)
+        api_slots: Optional semaphore shared between jobs to cap the total
+            number of in-flight API requests across all of them
+
+    Returns:
+        List of converted file paths in the same order as segments
+
+    Raises:
+        SegmentConversionError: if any segment failed; carries every failure
+    """
+    segments = list(segments)
+    if indices is None:
+        indices = list(range(len(segments)))
+    if max_workers is None:
+        max_workers = MAX_CONCURRENT_CONVERSIONS
+    max_workers = max(1, min(max_workers, len(segments) or 1))
+
+    results = [None] * len(segments)
+    failures = []
+    for i, _, success, result in iter_converted_segments(
+        enumerate(segments), voice_id, max_workers, changer, api_slots, max_in_flight=len(segments)
+    ):
+        if success:
+            results[i] = result
+        else:
+            failures.append((indices[i], result))
+        if on_segment_done:
+            on_segment_done(indices[i], success, result)
+
+    if failures:
+        failures.sort()
+        raise SegmentConversionError(failures, results)
+    return results
+
+
+def needs_streaming(input_file_path, budget_mb=None):
+    """True if the decoded input plus the merged output wouldn't fit in the memory budget"""
+    try:
+        info = probe_media(input_file_path)
+    except MediaProbeError:
+        return False
+    pcm_bytes = info["duration_ms"] / 1000 * (info["sample_rate"] or 44100) * (info["channels"] or 2) * 2
+    return 2 * pcm_bytes > (budget_mb or MEMORY_BUDGET_MB) * 2 ** 20
+
+
+def decode_input_audio(input_file_path, timer=None, streaming=False, work_dir=None):
+    """
+    Decode the audio track of an audio or video file
+
+    With streaming, the audio is decoded by ffmpeg into a temporary PCM file
+    (already at the upload sample rate and channel count) and returned as a
+    PCMFileAudio, which reads it in windows; call its close() when done.
+    Temporary files go into work_dir if given.
+    """
+    timer = timer or JobTimer()
+    if streaming:
+        from models.pcm_file import PCMFileAudio
+        with timer.span("decode", os.path.getsize(input_file_path)):
+            return PCMFileAudio.decode(input_file_path, UPLOAD_SAMPLE_RATE or None, UPLOAD_CHANNELS or None, work_dir)
+    if is_video_file(input_file_path):
+        with timer.span("extract"):
+            audio_path = extract_audio_from_video(input_file_path, work_dir)
+        try:
+            with timer.span("decode", os.path.getsize(audio_path)):
+                audio = load_audio(audio_path)
+        finally:
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
+    else:
+        with timer.span("decode", os.path.getsize(input_file_path)):
+            audio = load_audio(input_file_path)
+    return audio
+
+
+def estimate_scratch_bytes(input_file_path, voice_count=1):
+    """
+    Rough upper bound of the disk space a job needs while it runs
+
+    Counts the input, its decoded or extracted audio, and per voice the
+    downloaded segments (128 kbps MP3), the merged WAV and, for video, the
+    remuxed copy of the input.
+    """
+    input_bytes = os.path.getsize(input_file_path)
+    try:
+        info = probe_media(input_file_path)
+    except MediaProbeError:
+        return input_bytes * (2 + voice_count)
+    seconds = info["duration_ms"] / 1000
+    if needs_streaming(input_file_path):
+        decoded = seconds * (UPLOAD_SAMPLE_RATE or info["sample_rate"] or 44100) * (UPLOAD_CHANNELS or info["channels"] or 2) * 2
+    elif is_video_file(input_file_path):
+        decoded = seconds * (info["sample_rate"] or 44100) * (info["channels"] or 2) * 2
+    else:
+        decoded = 0
+    per_voice = seconds * 128000 / 8 + seconds * 44100 * 2 * 2 + (input_bytes if is_video_file(input_file_path) else 0)
+    return int(input_bytes + decoded + voice_count * per_voice)
+
+
+def job_work_dir(input_hash, voice_id):
+    """Work directory holding the manifest and converted segments of a job"""
+    return os.path.join(JOB_WORK_DIR, f"{input_hash[:16]}_{voice_id}")
+
+
+def timed_uploads(segments, boundaries, timer):
+    """Pass (index, buffer) pairs through, timing each encode as a span"""
+    segments = iter(segments)
+    while True:
+        start = time.perf_counter()
+        try:
+            index, buffer = next(segments)
+        except StopIteration:
+            return
+        begin, end = boundaries[index]
+        timer.record("encode", time.perf_counter() - start, buffer.getbuffer().nbytes, end - begin, index, start)
+        yield index, buffer
+
+
+class VoiceOutput:
+    """Per-voice state of a job: checkpoint manifest, merger, and the segments still to convert"""
+
+    def __init__(self, voice_option, manifest, merger):
+        self.voice_option = voice_option
+        self.voice_id = voice_option["id"]
+        self.manifest = manifest
+        self.merger = merger
+        self.pending = set(manifest.pending_indices())
+        self.failures = []
+        self.deferred = set()  # Pending segments left for a later run by admission control
+
+
+def fan_out(segments, outputs, sizes):
+    """
+    Send each encoded segment to every voice that still needs it
+
+    Yields (index, buffer, voice_id) triples for iter_converted_segments,
+    noting each segment's encoded size in sizes[index], so the bytes can be
+    counted as uploaded once a request for it has gone through.
+    """
+    for index, buffer in segments:
+        sizes[index] = buffer.getbuffer().nbytes
+        for output in outputs:
+            if index in output.pending:
+                yield index, buffer, output.voice_id
+
+
+def preview_voices(input_file_path, voice_options, duration_ms=None, max_workers=None, changer=None, work_dir=None):
+    """
+    Convert a short, speech-dense excerpt of a file into one or more voices
+
+    Meant to be heard before paying for a full conversion; all voices are
+    converted concurrently, and repeat previews come from the conversion cache.
+    Previews use quota and budget like any job, so they go through admission
+    control too; voices that don't fit get an error instead of a preview.
+    Previews served from the cache are free and use no quota.
+
+    Args:
+        input_file_path: Audio or video file
+        voice_options: Voice dicts with at least "id" (and optionally "price_per_min")
+        duration_ms: Excerpt length (defaults to config)
+        max_workers: Concurrent requests (defaults to one per voice, capped by config)
+        changer: VoiceChanger to use (defaults to the module-level instance)
+        work_dir: Directory for the excerpt and converted files (default: the
+            excerpt next to the input, conversions in the system temp directory)
+
+    Returns:
+        {"start_ms", "end_ms", "excerpt": path of the original excerpt (WAV),
+         "voices": {voice_id: {"output": path or None, "cost": float, "error": message or None}}}
+
+    Raises:
+        AdmissionRejected: if there's no quota or budget left for any of the voices
+    """
+    changer = changer or voice_changer
+    admission_control = get_admission_controller()
+    admission_control.preflight()
+    start_ms, excerpt = load_excerpt(input_file_path, duration_ms or PREVIEW_DURATION_MS)
+    base_name, _ = os.path.splitext(input_file_path)
+    excerpt_path = f"{base_name}_preview.wav"
+    if work_dir:
+        excerpt_path = os.path.join(work_dir, os.path.basename(excerpt_path))
+    excerpt.export(excerpt_path, format="wav").close()
+    upload = encode_audio(excerpt, "preview")
+
+    voice_options = list({option["id"]: option for option in voice_options}.values())
+    minutes = len(excerpt) / 60000
+    admission = admission_control.begin(voice_options)
+    voices = {}
+    converted = []
+    try:
+        for _, voice_id, success, result in iter_converted_segments(
+            [(0, upload, option["id"]) for option in voice_options], None,
+            max_workers=min(len(voice_options), max_workers or MAX_CONCURRENT_CONVERSIONS), changer=changer,
+            work_dir=work_dir, before_api_call=lambda i, v: admission_control.reserve(admission, v, i, minutes),
+        ):
+            if (voice_id, 0) in admission.declined:
+                result = f"Doesn't fit in {admission.reason}"
+            voices[voice_id] = {"output": result if success else None, "cost": 0, "error": None if success else result}
+            # Only previews that went to the API are paid for
+            if success and (voice_id, 0) in admission.reserved:
+                converted.append((voice_id, 0))
+    finally:
+        admission_control.settle(admission, converted)
+    if admission.declined and not converted and not any(voice["output"] for voice in voices.values()):
+        raise AdmissionRejected(f"The preview doesn't fit in {admission.reason}")
+    prices = {option["id"]: option.get("price_per_min", None) for option in voice_options}
+    for voice_id, _ in converted:
+        voices[voice_id]["cost"] = changer.calculate_cost(minutes, prices[voice_id])
+    return {"start_ms": start_ms, "end_ms": start_ms + len(excerpt), "excerpt": excerpt_path, "voices": voices}
+
+
+def process_voice_change(input_file_path, voice_option, max_workers=None, status=None, api_slots=None, stats=None,
+                         timer=None, cancel=None, workspace=None):
+    """
+    Convert the voice in an audio or video file
+
+    Args:
+        input_file_path: Audio or video file to convert
+        voice_option: Voice dict with at least "id" (and optionally "price_per_min")
+        max_workers: Concurrent segment conversions for this job (defaults to config)
+        status: Where progress messages go; anything with info/write/warning/error
+            methods (Streamlit by default, imported only then). If it also has
+            progress(finished, total, upload_bytes), that's called as each
+            conversion request finishes.
+        api_slots: Optional semaphore capping API requests across concurrent jobs
+        stats: Optional dict filled with upload_format, upload_bytes,
+            uploaded_ms and upload_bytes_per_min
+        timer: Optional JobTimer collecting per-stage spans; one is created if
+            not given. It's finished (and exported, if configured) when the
+            job ends.
+        cancel: Optional threading.Event that stops the job; it then raises
+            JobCancelled, and a rerun converts only the remaining segments
+        workspace: Optional Workspace that takes the job's intermediate files;
+            the caller cleans it up. Without one, a workspace is created and
+            removed when the job ends.
+
+    Returns:
+        (output_path, cost of what this run sent to the API)
+    """
+    results, errors = _process(input_file_path, [voice_option], max_workers, status, api_slots, stats, timer, cancel,
+                               workspace)
+    if voice_option["id"] in errors:
+        raise errors[voice_option["id"]]
+    result = results[voice_option["id"]]
+    return result["output"], result["cost"]
+
+
+def process_voice_changes(input_file_path, voice_options, max_workers=None, status=None, api_slots=None, stats=None,
+                          timer=None, cancel=None, workspace=None, input_hash=None):
+    """
+    Convert one audio or video file into several voices in a single job
+
+    The input is extracted, decoded, segmented and encoded once; each
+    encoded segment is then sent to every voice, all through one worker
+    pool, and every voice gets its own merged (and, for video, remuxed)
+    output. A voice that fails doesn't stop the others, and its converted
+    segments are kept so a rerun only converts what's missing.
+
+    Each conversion is admitted against the account quota and spending
+    budgets (see models.admission) just before it's sent; those served from
+    the conversion cache need neither. Conversions that don't fit are left
+    pending for a rerun, and a job with nothing that fits raises
+    AdmissionRejected before anything is uploaded.
+
+    Args:
+        input_file_path: Audio or video file to convert
+        voice_options: Voice dicts with at least "id" (and optionally "price_per_min")
+        max_workers, status, api_slots, stats, timer, cancel, workspace: As for process_voice_change
+        input_hash: file_sha256 of the input, if the caller already has it (saves reading the file again)
+
+    Returns:
+        {voice_id: {"output": path or None, "cost": float, "error": message or None}}, where
+        cost covers only what this run sent to the API (cached conversions and
+        segments converted by earlier runs are free)
+    """
+    results, errors = _process(input_file_path, voice_options, max_workers, status, api_slots, stats, timer, cancel,
+                               workspace, input_hash)
+    for voice_id, error in errors.items():
+        results[voice_id]["error"] = str(error)
+    return results
+
+
+def _process(input_file_path, voice_options, max_workers, status, api_slots, stats, timer, cancel=None,
+             workspace=None, input_hash=None):
+    """Run a job for one or more voices; returns (results, errors) and finishes the timer"""
+    if status is None:
+        import streamlit as st
+        status = st
+    voice_options = list({option["id"]: option for option in voice_options}.values())
+    timer = timer if timer is not None else JobTimer()
+    timer.job.update(input=os.path.basename(input_file_path),
+                     voice_id=",".join(option["id"] for option in voice_options))
+    own_workspace = workspace is None
+    workspace = workspace or Workspace()
+    try:
+        results, errors = _run_voice_changes(input_file_path, voice_options, max_workers, status, api_slots,
+                                             stats if stats is not None else {}, timer, cancel, workspace.path,
+                                             input_hash)
+    except JobCancelled:
+        timer.finish("cancelled")
+        raise
+    except AdmissionRejected:
+        timer.finish("rejected")
+        raise
+    except Exception:
+        timer.finish("failed")
+        raise
+    finally:
+        if own_workspace:
+            workspace.cleanup()
+    timer.finish("failed" if len(errors) == len(voice_options) else "partial" if errors else "done")
+    return results, errors
+
+
+def _run_voice_changes(input_file_path, voice_options, max_workers, status, api_slots, stats, timer, cancel=None,
+                       work_dir=None, input_hash=None):
+    """Body of the job: decode and segment once, convert into every voice, merge and mux each"""
     # Determine if we're processing video or audio
     is_video = is_video_file(input_file_path)
-    
-    # Segment the media file
-    st.info("Segmenting media...")
-    segments, is_extracted_audio = segment_media(input_file_path)
-    
-    processed_segments = []
-    total_segments = len(segments)
-    total_cost = 0
-    
-    st.info(f"Processing {total_segments} segments...")
-    for i, seg in enumerate(segments):
-        st.write(f"Processing segment {i+1}/{total_segments}")
-        success, result = voice_changer.change_voice(
-            input_audio_path=seg,
-            voice_id=voice_option["id"]
-        )
-        
-        if not success:
-            st.error(f"Error processing segment {i+1}: {result}")
-            raise Exception(result)
-            
-        processed_segments.append(result)
-    
-    # Create the base file path for output
-    base_name, ext = os.path.splitext(input_file_path)
-    audio_output_path = f"{base_name}_changed_{voice_option['id']}.wav"
-    
-    # Merge the processed audio segments
-    st.info("Merging processed segments...")
-    merged_audio = merge_audio(processed_segments, audio_output_path)
-    
-    # Calculate the cost
-    from pydub import AudioSegment
-    audio = AudioSegment.from_file(merged_audio)
-    duration_ms = len(audio)
-    total_minutes = math.ceil(duration_ms / 60000)
-    # Use the price from the voice option if available, otherwise None to use default
-    total_cost = voice_changer.calculate_cost(total_minutes, voice_option.get("price_per_min", None))
-    
-    # If we're processing video, replace the audio in the video
-    if is_video:
-        st.info("Replacing audio in video...")
-        video_output_path = f"{base_name}_changed_{voice_option['id']}{ext}"
-        final_output = replace_video_audio(input_file_path, merged_audio, video_output_path)
-        # Clean up the intermediate audio file
-        if os.path.exists(merged_audio) and merged_audio != input_file_path:
-            os.remove(merged_audio)
-        return final_output, total_cost
-    else:
-        return merged_audio, total_cost
+    many = len(voice_options) > 1
+
+    # Decode once and plan the segments; inputs too long for the memory
+    # budget are decoded to disk and read, and merged, in windows
+    streaming = needs_streaming(input_file_path)
+    if streaming:
+        status.info("Long input: processing it from disk in windows to stay within the memory budget")
+    # Nothing is decoded for a job that can't run at all
+    admission_control = get_admission_controller()
+    admission_control.preflight()
+    status.info("Decoding and planning segments...")
+    audio = decode_input_audio(input_file_path, timer, streaming, work_dir)
+    close_source = getattr(audio, "close", None)
+    outputs = []
+    try:
+        total_length_ms = len(audio)
+        with timer.span("segment", audio_ms=total_length_ms):
+            boundaries = plan_segments(audio, MAX_SEGMENT_DURATION_MS)
+        total_segments = len(boundaries)
+
+        # Create the base file path for output
+        base_name, ext = os.path.splitext(input_file_path)
+
+        # Each voice picks up where a previous run of the same job stopped.
+        # Segments it already has go straight to its merger, which writes each
+        # one into the output as soon as all earlier segments have arrived.
+        from models.merge_engine import OrderedMerger
+        # Encoding and decoding of segments run in worker processes when the media pool is enabled
+        media_pool = get_media_pool()
+        input_hash = input_hash or file_sha256(input_file_path)
+        for voice_option in voice_options:
+            voice_id = voice_option["id"]
+            manifest = JobManifest.open(job_work_dir(input_hash, voice_id), input_hash, voice_id, boundaries)
+            merger = OrderedMerger(boundaries, total_length_ms, SEGMENT_CROSSFADE_MS,
+                                   stream_to=f"{base_name}_changed_{voice_id}.wav.part" if streaming else None,
+                                   pool=media_pool)
+            output = VoiceOutput(voice_option, manifest, merger)
+            if len(output.pending) < total_segments:
+                status.info(f"Resuming job{f' for {voice_id}' if many else ''}: "
+                            f"{total_segments - len(output.pending)} of {total_segments} segments already converted")
+            for i in range(total_segments):
+                if i not in output.pending:
+                    with timer.span("merge", segment=i, voice_id=voice_id):
+                        output.merger.add(i, manifest.segments[i]["output"])
+            outputs.append(output)
+        by_voice = {output.voice_id: output for output in outputs}
+
+        # Each request is admitted against the quota and budgets as it's about
+        # to be sent (cached conversions need neither); what doesn't fit stays
+        # pending in the checkpoint. Segments converted by earlier runs count
+        # towards the per-job budget.
+        segment_minutes = [(end - start) / 60000 for start, end in boundaries]
+        converted_before = [(output.voice_id, i, segment_minutes[i])
+                            for output in outputs for i in range(total_segments) if i not in output.pending]
+        admission = admission_control.begin(voice_options, converted_before)
+
+        # The missing segments are exported once, one at a time, and uploaded to
+        # every voice as soon as each is ready, overlapping segmenting,
+        # conversion and merging
+        needed = set().union(*(output.pending for output in outputs))
+        requests = sum(len(output.pending) for output in outputs)
+        status.info(f"Processing {len(needed)} segments{f' into {len(outputs)} voices' if many else ''}...")
+        # Only requests that went through count as uploaded, not those in flight or failed
+        stats.update(upload_format=UPLOAD_FORMAT, upload_bytes=0, uploaded_ms=0)
+        sizes = {}
+        segment_stream = fan_out(timed_uploads(split_audio(
+            audio, boundaries, UPLOAD_FORMAT, needed, UPLOAD_SAMPLE_RATE, UPLOAD_CHANNELS, UPLOAD_BITRATE, media_pool,
+        ), boundaries, timer), outputs, sizes)
+        del audio  # The generator keeps the decoded audio alive only until the last segment is exported
+        report_progress = getattr(status, "progress", None)
+        if report_progress:
+            report_progress(0, requests, 0)
+        done = finished = 0
+        converted = []
+        try:
+            for i, voice_id, success, result in iter_converted_segments(
+                segment_stream, None, max_workers=max_workers, api_slots=api_slots, timer=timer, cancel=cancel,
+                work_dir=work_dir,
+                before_api_call=lambda i, v: admission_control.reserve(admission, v, i, segment_minutes[i]),
+            ):
+                output = by_voice[voice_id]
+                label = f"{voice_id} segment" if many else "segment"
+                if (voice_id, i) in admission.declined:
+                    if not any(other.deferred for other in outputs):
+                        status.warning(f"Some segments don't fit in {admission.reason}; they're left for a later run")
+                    output.deferred.add(i)
+                elif success:
+                    done += 1
+                    # Conversions served from the cache weren't uploaded and aren't paid for
+                    if (voice_id, i) in admission.reserved:
+                        converted.append((voice_id, i))
+                        stats["upload_bytes"] += sizes[i]
+                        stats["uploaded_ms"] += boundaries[i][1] - boundaries[i][0]
+                    output.manifest.mark_done(i, result)
+                    status.write(f"Processed {label} {i+1}/{total_segments} ({done}/{requests} done)")
+                    with timer.span("merge", segment=i, voice_id=voice_id):
+                        output.merger.add(i, output.manifest.segments[i]["output"])
+                else:
+                    output.manifest.mark_failed(i, result)
+                    output.failures.append((i, result))
+                    status.error(f"Error processing {label} {i+1}: {result}")
+                finished += 1
+                if report_progress:
+                    report_progress(finished, requests, stats["upload_bytes"])
+        finally:
+            # Frees the reservation for other jobs and books what was actually converted
+            admission_control.settle(admission, converted)
+        if admission.declined and not done:
+            raise AdmissionRejected(f"The job doesn't fit in {admission.reason}")
+        if cancel is not None and cancel.is_set():
+            raise JobCancelled(f"Cancelled after {done} of {requests} conversions; "
+                               "run the job again to convert only the remaining segments")
+    except Exception:
+        for output in outputs:
+            output.merger.discard()
+        raise
+    finally:
+        if close_source:
+            close_source()
+
+    minutes = stats["uploaded_ms"] / 60000
+    stats["upload_bytes_per_min"] = round(stats["upload_bytes"] / minutes) if minutes else 0
+    if stats["upload_bytes"]:
+        status.info(f"Uploaded {stats['upload_bytes'] / 1e6:.1f} MB as {UPLOAD_FORMAT} "
+                    f"({stats['upload_bytes_per_min'] / 1e3:.0f} KB per minute of audio)")
+
+    # Each voice costs what this run sent to the API for it; skipped silences,
+    # cached conversions and segments converted by earlier runs are free
+    sent_minutes = {output.voice_id: 0.0 for output in outputs}
+    for voice_id, i in converted:
+        sent_minutes[voice_id] += segment_minutes[i]
+
+    results, errors = {}, {}
+    for output in outputs:
+        voice_id = output.voice_id
+        if output.failures:
+            status.warning(f"{output.manifest.completed_count()} of {total_segments} segments"
+                           f"{f' for {voice_id}' if many else ''} are saved; "
+                           "run the job again to convert only the remaining ones.")
+            errors[voice_id] = SegmentConversionError(sorted(output.failures), output.manifest.outputs())
+            output.merger.discard()
+            results[voice_id] = {"output": None, "cost": 0, "error": None}
+            continue
+        if output.deferred:
+            errors[voice_id] = AdmissionRejected(
+                f"{len(output.deferred)} of {total_segments} segments{f' for {voice_id}' if many else ''} "
+                f"don't fit in {admission.reason}; run the job again once there's quota or budget "
+                "to convert only those")
+            output.merger.discard()
+            results[voice_id] = {"output": None, "cost": 0, "error": None}
+            continue
+
+        # Export the merged audio
+        status.info(f"Merging processed segments{f' for {voice_id}' if many else ''}...")
+        audio_output_path = f"{base_name}_changed_{voice_id}.wav"
+        with timer.span("merge", audio_ms=total_length_ms, voice_id=voice_id):
+            final_output = output.merger.finish(audio_output_path)
+
+        # If we're processing video, replace the audio in the video
+        if is_video:
+            status.info("Replacing audio in video...")
+            video_output_path = f"{base_name}_changed_{voice_id}{ext}"
+            with timer.span("mux", os.path.getsize(input_file_path), voice_id=voice_id):
+                final_output = replace_video_audio(input_file_path, audio_output_path, video_output_path)
+            # Clean up the intermediate audio file
+            if os.path.exists(audio_output_path) and audio_output_path != input_file_path:
+                os.remove(audio_output_path)
+        output.manifest.remove()
+
+        # Use the price from the voice option if available, otherwise None to use default
+        cost = voice_changer.calculate_cost(sent_minutes[voice_id], output.voice_option.get("price_per_min", None))
+        results[voice_id] = {"output": final_output, "cost": cost, "error": None}
+    return results, errors
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import uuid
+import threading
+from config import (
+    QUOTA_UNITS_PER_MIN, QUOTA_CACHE_S, JOB_BUDGET_USD, DAILY_BUDGET_USD, SPEND_LEDGER_PATH,
+    DEFAULT_VOICE_PRICE_PER_MIN,
+)
+
+# Days of spending kept in the ledger
+LEDGER_DAYS = 31
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job can't start because the account quota or a spending budget is used up"""
+
+
+def _today():
+    return time.strftime("%Y-%m-%d")
+
+
+class Admission:
+    """
+    The API requests one job was allowed to send, and what it reserved for them
+
+    Requests are reserved one at a time, as they're about to be sent, so
+    conversions served from the cache never use quota or budget. Once a
+    request doesn't fit, the admission closes: it and every later request
+    are declined and left for a later run, and reason names the limit.
+    """
+
+    def __init__(self, prices, spent=0.0):
+        self.id = uuid.uuid4().hex
+        self.prices = prices
+        self.spent = spent  # Cost of the job's conversions in earlier runs
+        self.reserved = {}  # (voice_id, segment_index) -> (minutes, cost)
+        self.declined = set()  # (voice_id, segment_index)
+        self.reason = None
+
+    @property
+    def minutes(self):
+        return sum(minutes for minutes, _ in self.reserved.values())
+
+    @property
+    def cost(self):
+        return sum(cost for _, cost in self.reserved.values())
+
+
+class AdmissionController:
+    """
+    Preflight check of conversion jobs against the account quota and spending budgets
+
+    The remaining speech-to-speech quota is read from the account (cached
+    for cache_s, and refreshed in the background once stale, like the voice
+    catalog) and converted to minutes of audio at units_per_min. Jobs
+    reserve the minutes and cost they're admitted for until they settle,
+    so concurrent jobs can't promise the same quota twice. Spending per day
+    is kept in a small JSON ledger.
+
+    Limits that are 0 (or a quota that can't be read) don't restrict anything.
+    """
+
+    def __init__(self, client=None, units_per_min=QUOTA_UNITS_PER_MIN, cache_s=QUOTA_CACHE_S,
+                 job_budget=JOB_BUDGET_USD, daily_budget=DAILY_BUDGET_USD, ledger_path=SPEND_LEDGER_PATH):
+        self._client = client
+        self.units_per_min = units_per_min
+        self.cache_s = cache_s
+        self.job_budget = job_budget
+        self.daily_budget = daily_budget
+        self.ledger_path = ledger_path
+        self._lock = threading.Lock()
+        self._remaining_units = None
+        self._fetched_at = 0
+        self._refresh_thread = None
+        self._reservations = {}  # admission id -> (minutes, cost)
+
+    @property
+    def client(self):
+        if self._client is None:
+            from models.api_client import get_shared_client
+            self._client = get_shared_client()
+        return self._client
+
+    def refresh_quota(self):
+        """Read the remaining quota from the account; the request runs without holding the lock"""
+        try:
+            units = float(self.client.user.get().subscription.voice_conversion_remaining)
+        except Exception as e:
+            units = None
+            print(f"Could not read the remaining conversion quota, not limiting jobs by it: {e}")
+        with self._lock:
+            self._remaining_units = units
+            self._fetched_at = time.time()
+
+    def refresh_in_background(self):
+        """Start a quota refresh thread unless one is already running"""
+        with self._lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh_quota, daemon=True)
+            self._refresh_thread.start()
+
+    def _ensure_quota(self, wait):
+        # Fetches synchronously only when nothing was read yet and wait is set;
+        # otherwise a stale (or missing) quota is refreshed in the background
+        if not self._fetched_at and wait:
+            self.refresh_quota()
+        elif not self._fetched_at or time.time() - self._fetched_at >= self.cache_s:
+            self.refresh_in_background()
+
+    def _load_ledger(self):
+        try:
+            with open(self.ledger_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_ledger(self, ledger):
+        os.makedirs(os.path.dirname(self.ledger_path) or ".", exist_ok=True)
+        tmp_path = self.ledger_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(ledger, f, indent=2)
+        os.replace(tmp_path, self.ledger_path)
+
+    def available(self, wait=False):
+        """
+        What new jobs can still use, after what running jobs reserved
+
+        Never waits for the API unless wait is set: before the quota has been
+        read, minutes is None and quota_pending is True while it's fetched.
+
+        Returns:
+            {"minutes": quota minutes or None, "day_budget": dollars left today or None,
+             "quota_pending": True until the quota has been read once}
+        """
+        self._ensure_quota(wait)
+        with self._lock:
+            available = self._available()
+            available["quota_pending"] = not self._fetched_at
+        return available
+
+    def _available(self):
+        reserved_minutes = sum(minutes for minutes, _ in self._reservations.values())
+        reserved_cost = sum(cost for _, cost in self._reservations.values())
+        minutes = None
+        if self._remaining_units is not None and self.units_per_min:
+            minutes = max(0.0, self._remaining_units / self.units_per_min - reserved_minutes)
+        day_budget = None
+        if self.daily_budget:
+            spent = self._load_ledger().get(_today(), 0.0)
+            day_budget = max(0.0, self.daily_budget - spent - reserved_cost)
+        return {"minutes": minutes, "day_budget": day_budget}
+
+    def preflight(self):
+        """
+        Cheap check before anything is decoded
+
+        Raises:
+            AdmissionRejected: if there's no quota or budget left at all
+        """
+        self._ensure_quota(wait=True)
+        with self._lock:
+            available = self._available()
+        if available["minutes"] is not None and available["minutes"] < 1 / 60:
+            raise AdmissionRejected("No speech-to-speech quota left on the account "
+                                    "(or it's all reserved by running jobs)")
+        if available["day_budget"] is not None and available["day_budget"] <= 0:
+            raise AdmissionRejected(f"Today's budget of ${self.daily_budget:.2f} is used up")
+
+    def begin(self, voice_options, converted=()):
+        """
+        Start admitting a job's API requests
+
+        Args:
+            voice_options: Voice dicts with "id" and optionally "price_per_min"
+            converted: (voice_id, segment_index, minutes) the job converted in
+                earlier runs; they count towards the per-job budget, so
+                rerunning a job doesn't renew it
+
+        Returns:
+            Admission for reserve() (call settle() with it when the job ends)
+        """
+        prices = {option["id"]: option.get("price_per_min") or DEFAULT_VOICE_PRICE_PER_MIN
+                  for option in voice_options}
+        self._ensure_quota(wait=True)
+        return Admission(prices, sum(minutes * prices[voice_id] for voice_id, _, minutes in converted))
+
+    def reserve(self, admission, voice_id, index, minutes):
+        """
+        Reserve one API request of a job just before it's sent
+
+        It's admitted if it fits in the remaining quota, the per-job budget
+        and today's budget, after what running jobs reserved; otherwise it
+        and every later request of the job are declined, so a job that
+        doesn't fit runs partially and a later run picks up the rest.
+
+        Returns:
+            True if the request may be sent
+        """
+        cost = minutes * admission.prices[voice_id]
+        self._ensure_quota(wait=True)
+        with self._lock:
+            if admission.reason is None:
+                available = self._available()
+                limits = [
+                    (minutes, available["minutes"], "the account's remaining speech-to-speech quota"),
+                    (admission.spent + admission.cost + cost, self.job_budget or None,
+                     f"the per-job budget of ${self.job_budget:.2f}"),
+                    (cost, available["day_budget"], f"what's left of today's ${self.daily_budget:.2f} budget"),
+                ]
+                exceeded = [label for amount, limit, label in limits if limit is not None and amount > limit]
+                if exceeded:
+                    admission.reason = exceeded[0]
+            if admission.reason is not None:
+                admission.declined.add((voice_id, index))
+                return False
+            admission.reserved[(voice_id, index)] = (minutes, cost)
+            self._reservations[admission.id] = (admission.minutes, admission.cost)
+        return True
+
+    def settle(self, admission, converted):
+        """
+        Release a job's reservation and record what it actually used
+
+        Args:
+            admission: From begin()
+            converted: (voice_id, segment_index) of the reserved requests that succeeded
+        """
+        used = [admission.reserved[key] for key in converted if key in admission.reserved]
+        minutes = sum(request_minutes for request_minutes, _ in used)
+        cost = sum(request_cost for _, request_cost in used)
+        with self._lock:
+            self._reservations.pop(admission.id, None)
+            if self._remaining_units is not None:
+                # Keeps the cached quota close until the next refresh
+                self._remaining_units = max(0.0, self._remaining_units - minutes * self.units_per_min)
+            if cost and self.daily_budget:
+                ledger = self._load_ledger()
+                ledger[_today()] = round(ledger.get(_today(), 0.0) + cost, 4)
+                ledger = dict(sorted(ledger.items())[-LEDGER_DAYS:])
+                try:
+                    self._save_ledger(ledger)
+                except OSError as e:
+                    print(f"Could not update the spending ledger: {e}")
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Process-wide admission controller"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
@@ -0,0 +1,77 @@
+import threading
+from config import (
+    ELEVEN_LABS_API_KEY,
+    ELEVEN_LABS_BASE_URL,
+    API_POOL_SIZE,
+    API_TIMEOUT_S,
+    API_CONNECT_TIMEOUT_S,
+    API_KEEPALIVE_EXPIRY_S,
+)
+
+_lock = threading.Lock()
+_shared_client = None
+_http_client = None
+_requests_session = None
+
+
+def get_http_client():
+    """Process-wide httpx client with a keep-alive connection pool, used by the ElevenLabs SDK"""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=API_POOL_SIZE,
+                    max_keepalive_connections=API_POOL_SIZE,
+                    keepalive_expiry=API_KEEPALIVE_EXPIRY_S,
+                ),
+                timeout=httpx.Timeout(API_TIMEOUT_S, connect=API_CONNECT_TIMEOUT_S),
+                follow_redirects=True,
+            )
+        return _http_client
+
+
+def get_shared_client():
+    """
+    Process-wide ElevenLabs client, built on first use
+
+    Wrapped in a ResilientClient so every caller in the process shares one
+    rate limiter and circuit breaker, and one pool of warm TLS connections.
+    """
+    global _shared_client
+    if _shared_client is not None:
+        return _shared_client
+    if not ELEVEN_LABS_API_KEY:
+        raise ValueError("ELEVENLABS_API_KEY not found in environment variables or config")
+    http_client = get_http_client()
+    with _lock:
+        if _shared_client is None:
+            from elevenlabs.client import ElevenLabs
+            from models.resilient_client import ResilientClient
+            _shared_client = ResilientClient(ElevenLabs(
+                api_key=ELEVEN_LABS_API_KEY, base_url=ELEVEN_LABS_BASE_URL, timeout=API_TIMEOUT_S,
+                httpx_client=http_client,
+            ))
+        return _shared_client
+
+
+def get_shared_client_metrics():
+    """Retry, throttle and circuit breaker metrics of the shared client, or None if it hasn't been built"""
+    client = _shared_client
+    return client.get_metrics() if client is not None else None
+
+
+def get_requests_session():
+    """Process-wide requests.Session with connection pooling, for downloads such as URL inputs"""
+    global _requests_session
+    with _lock:
+        if _requests_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _requests_session = session
+        return _requests_session
@@ -0,0 +1,134 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from config import (
+    CONVERSION_CACHE_ENABLED,
+    CONVERSION_CACHE_DIR,
+    CONVERSION_CACHE_MAX_BYTES,
+    CONVERSION_CACHE_MAX_AGE_S,
+)
+
+
+def conversion_cache_key(audio_bytes, voice_id, model_id, output_format):
+    """Content address for one conversion: hash of the input audio plus the conversion settings"""
+    digest = hashlib.sha256()
+    digest.update(audio_bytes)
+    for part in (voice_id, model_id, output_format):
+        digest.update(b"\0")
+        digest.update(str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    Persistent on-disk cache of speech-to-speech results
+
+    Entries are files named by their conversion_cache_key. File mtimes
+    track last use, so eviction is least-recently-used, bounded by total
+    size and by age.
+    """
+
+    def __init__(self, cache_dir, max_bytes=CONVERSION_CACHE_MAX_BYTES, max_age_s=CONVERSION_CACHE_MAX_AGE_S):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def get(self, key, suffix=".mp3", dir=None):
+        """
+        Look up a cached result
+
+        Args:
+            key: conversion_cache_key of the conversion
+            suffix: File extension of the entry
+            dir: Directory for the returned copy (default: the system temp directory)
+
+        Returns:
+            Path to a fresh copy of the cached audio (the caller owns it and
+            may delete it), or None on a miss
+        """
+        entry = self._entry_path(key, suffix)
+        with self._lock:
+            if not os.path.exists(entry) or time.time() - os.path.getmtime(entry) > self.max_age_s:
+                self.misses += 1
+                return None
+            self.hits += 1
+            os.utime(entry)  # Mark as recently used
+        fd, copy_path = tempfile.mkstemp(suffix=suffix, dir=dir)
+        os.close(fd)
+        shutil.copyfile(entry, copy_path)
+        return copy_path
+
+    def put(self, key, source_path, suffix=".mp3"):
+        """Store a copy of source_path under key, then evict down to the limits"""
+        entry = self._entry_path(key, suffix)
+        # Copy to a temporary name first so readers never see a partial entry
+        partial = f"{entry}.{threading.get_ident()}.part"
+        shutil.copyfile(source_path, partial)
+        os.replace(partial, entry)
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".part"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        with self._lock:
+            entries = sorted(self._entries())
+            now = time.time()
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in entries:
+                if now - mtime <= self.max_age_s and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current cache size"""
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Process-wide cache configured from config.py, or None when caching is disabled"""
+    global _default_cache
+    if not CONVERSION_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ConversionCache(CONVERSION_CACHE_DIR)
+        return _default_cache
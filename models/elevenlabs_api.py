@@ -3,9 +3,9 @@ import os
 import time
 from pydub import AudioSegment
 import streamlit as st
-from elevenlabs.client import ElevenLabs
-from io import BytesIO
-import tempfile
+from models.stream_sink import write_audio_stream
+from models.api_client import get_shared_client
+from models.media_processor import encode_audio
 
 # Get API key from config
 from config import ELEVEN_LABS_API_KEY, ELEVEN_LABS_API_URL
@@ -14,13 +14,10 @@ from config import ELEVEN_LABS_API_KEY, ELEVEN_LABS_API_URL
 API_KEY = ELEVEN_LABS_API_KEY
 API_URL = ELEVEN_LABS_API_URL
 
-# Initialize the ElevenLabs client
-elevenlabs_client = ElevenLabs(api_key=API_KEY)
-
 def get_voice_options():
     """Get available voices from Eleven Labs API"""
     try:
-        voices = elevenlabs_client.voices.get_all()
+        voices = get_shared_client().voices.get_all()
         voice_options = {}
         for voice in voices.dict().get("voices", []):
                 voice_options[voice["name"]] = {
@@ -126,37 +123,25 @@ def voice_change_audio_segment(segment_path, voice_id):
             st.warning(f"Warning: Audio segment exceeds 5 minutes, it may be rejected by API")
             print(f"Warning: Audio segment exceeds 5 minutes, it may be rejected by API")
         
-        # Convert the audio to bytes for the SDK
-        temp_mp3 = segment_path.replace('.wav', '_temp.mp3')
-        audio.export(temp_mp3, format="mp3")
-        
-        # Prepare the audio data
-        with open(temp_mp3, "rb") as f:
-            file_data = f.read()
-            audio_data = BytesIO(file_data)
-            audio_data.name = os.path.basename(temp_mp3)  # Add name attribute
+        # Encode in memory with the configured upload policy
+        name = os.path.splitext(os.path.basename(segment_path))[0]
+        audio_data = encode_audio(audio, name)
         
         st.info(f"Sending audio to Eleven Labs for voice changing...")
         
         # Use the speech_to_speech method from the SDK
         try:
             # Get the generator from the API
-            audio_output_generator = elevenlabs_client.speech_to_speech.convert(
+            audio_output_generator = get_shared_client().speech_to_speech.convert(
                 voice_id=voice_id,
                 audio=audio_data,
                 model_id="eleven_multilingual_sts_v2",
                 output_format="mp3_44100_128",
             )
             
-            # Convert generator to bytes by consuming all chunks
-            audio_bytes = b''
-            for chunk in audio_output_generator:
-                audio_bytes += chunk
-            
-            # Save the audio output
+            # Write chunks to the output file as they arrive
             output_path = segment_path.replace(".wav", f"_changed_{voice_id}.wav")
-            with open(output_path, "wb") as f:
-                f.write(audio_bytes)
+            write_audio_stream(audio_output_generator, output_path)
                 
             st.success(f"Voice change successful for segment")
             
@@ -169,10 +154,6 @@ def voice_change_audio_segment(segment_path, voice_id):
                 
             raise Exception(error_msg)
             
-        # Clean up temporary file
-        if os.path.exists(temp_mp3):
-            os.remove(temp_mp3)
-            
         return output_path
             
     except Exception as e:
@@ -0,0 +1,96 @@
+import os
+import shutil
+import subprocess
+
+# Audio codec to use when muxing new audio into each video container
+AUDIO_CODECS_BY_CONTAINER = {
+    ".mp4": "aac",
+    ".mov": "aac",
+    ".mkv": "aac",
+    ".flv": "aac",
+    ".avi": "libmp3lame",
+    ".wmv": "wmav2",
+}
+
+
+class FFmpegError(Exception):
+    """Raised when ffmpeg is unavailable or a command fails"""
+
+
+def find_ffmpeg():
+    """Path to an ffmpeg binary: the one on PATH, else the one bundled with imageio-ffmpeg (a MoviePy dependency)"""
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def run_ffmpeg(args):
+    """Run ffmpeg with the given arguments, raising FFmpegError on failure"""
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        raise FFmpegError("ffmpeg not found")
+    result = subprocess.run(
+        [ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin", "-y"] + args,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise FFmpegError(result.stderr.decode("utf-8", "replace").strip() or f"ffmpeg exited with {result.returncode}")
+
+
+def extract_audio(video_path, output_path):
+    """Decode only the audio stream of a video to 16-bit PCM WAV"""
+    run_ffmpeg(["-i", video_path, "-vn", "-map", "0:a:0", "-acodec", "pcm_s16le", output_path])
+    return output_path
+
+
+def decode_pcm(input_path, frame_rate, channels, start_ms=0, duration_ms=None):
+    """
+    Decode (part of) the first audio stream of a file to interleaved 16-bit PCM bytes
+
+    Seeking happens in the demuxer, so only the requested stretch is decoded,
+    and video streams are never decoded.
+    """
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        raise FFmpegError("ffmpeg not found")
+    args = [ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin"]
+    if start_ms:
+        args += ["-ss", f"{start_ms / 1000:.3f}"]
+    if duration_ms:
+        args += ["-t", f"{duration_ms / 1000:.3f}"]
+    args += ["-i", input_path, "-vn", "-map", "0:a:0", "-f", "s16le", "-acodec", "pcm_s16le",
+             "-ar", str(frame_rate), "-ac", str(channels), "pipe:1"]
+    result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise FFmpegError(result.stderr.decode("utf-8", "replace").strip() or f"ffmpeg exited with {result.returncode}")
+    return result.stdout
+
+
+def remux_audio(video_path, audio_path, output_path):
+    """
+    Replace a video's audio track, copying the video stream as-is
+
+    Only the new audio is encoded; the video is never decoded or
+    re-encoded, so the cost is mostly I/O.
+    """
+    _, ext = os.path.splitext(output_path.lower())
+    audio_codec = AUDIO_CODECS_BY_CONTAINER.get(ext, "aac")
+    args = [
+        "-i", video_path, "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy", "-c:a", audio_codec,
+    ]
+    if ext in (".mp4", ".mov"):
+        args += ["-movflags", "+faststart"]
+    try:
+        run_ffmpeg(args + [output_path])
+    except FFmpegError:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return output_path
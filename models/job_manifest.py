@@ -0,0 +1,154 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+MANIFEST_NAME = "manifest.json"
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# (input hash, voice ID) of jobs running in this process. Jobs with the same
+# input and voice share one checkpoint directory, so a second one waits for the first
+_busy_keys = set()
+_keys_free = threading.Condition()
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """Hash a file in blocks so large uploads are never read into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def claim_checkpoints(keys, cancel=None, on_wait=None):
+    """
+    Wait until no other job in the process uses the checkpoints of keys, then claim them
+
+    Args:
+        keys: Set of (input_hash, voice_id)
+        cancel: Optional threading.Event that stops the wait
+        on_wait: Optional callback, called once if the job has to wait
+
+    Returns:
+        True once claimed (release with release_checkpoints), False if cancelled meanwhile
+    """
+    with _keys_free:
+        if keys & _busy_keys and on_wait:
+            on_wait()
+        while keys & _busy_keys:
+            if cancel is not None and cancel.is_set():
+                return False
+            _keys_free.wait(0.5)
+        _busy_keys.update(keys)
+    return True
+
+
+def release_checkpoints(keys):
+    with _keys_free:
+        _busy_keys.difference_update(keys)
+        _keys_free.notify_all()
+
+
+class JobManifest:
+    """
+    Checkpoint of a conversion job, persisted as JSON inside its work directory
+
+    Records the input hash, the target voice, every segment's boundaries,
+    status and converted output path. A job restarted against the same
+    input and voice reuses the segments already marked done.
+    """
+
+    def __init__(self, work_dir, data):
+        self.work_dir = work_dir
+        self.path = os.path.join(work_dir, MANIFEST_NAME)
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, work_dir, input_hash, voice_id, boundaries):
+        """
+        Load the manifest in work_dir if it describes the same job, otherwise start a new one
+
+        Args:
+            work_dir: Directory holding the manifest and converted segments
+            input_hash: file_sha256 of the input media
+            voice_id: Target voice ID
+            boundaries: List of (start_ms, end_ms) for every segment
+        """
+        os.makedirs(work_dir, exist_ok=True)
+        manifest_path = os.path.join(work_dir, MANIFEST_NAME)
+        boundaries = [list(b) for b in boundaries]
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path) as f:
+                    data = json.load(f)
+                if (data.get("input_hash") == input_hash and data.get("voice_id") == voice_id
+                        and [s["bounds"] for s in data.get("segments", [])] == boundaries):
+                    manifest = cls(work_dir, data)
+                    manifest._drop_missing_outputs()
+                    return manifest
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Ignoring unreadable job manifest {manifest_path}: {e}")
+
+        data = {
+            "input_hash": input_hash,
+            "voice_id": voice_id,
+            "segments": [
+                {"bounds": b, "status": STATUS_PENDING, "output": None, "error": None}
+                for b in boundaries
+            ],
+        }
+        manifest = cls(work_dir, data)
+        manifest.save()
+        return manifest
+
+    @property
+    def segments(self):
+        return self.data["segments"]
+
+    def _drop_missing_outputs(self):
+        # A segment only counts as done if its converted file is still there
+        for seg in self.segments:
+            if seg["status"] == STATUS_DONE and not (seg["output"] and os.path.exists(seg["output"])):
+                seg["status"], seg["output"] = STATUS_PENDING, None
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def pending_indices(self):
+        """Indices of segments that still need converting"""
+        return [i for i, seg in enumerate(self.segments) if seg["status"] != STATUS_DONE]
+
+    def completed_count(self):
+        return sum(1 for seg in self.segments if seg["status"] == STATUS_DONE)
+
+    def mark_done(self, index, result_path):
+        """Move a converted segment into the work directory and checkpoint it"""
+        _, ext = os.path.splitext(result_path)
+        output = os.path.join(self.work_dir, f"segment_{index}{ext}")
+        shutil.move(result_path, output)
+        with self._lock:
+            self.segments[index].update(status=STATUS_DONE, output=output, error=None)
+            self.save()
+
+    def mark_failed(self, index, error):
+        with self._lock:
+            self.segments[index].update(status=STATUS_FAILED, error=str(error))
+            self.save()
+
+    def outputs(self):
+        """Converted segment paths in segment order (only valid once every segment is done)"""
+        return [seg["output"] for seg in self.segments]
+
+    def remove(self):
+        """Delete the work directory once the job's final output exists"""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
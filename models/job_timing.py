@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from config import METRICS_LOG_PATH, METRICS_PROM_PATH
+
+# Pipeline stages in the order they happen, used to sort breakdowns
+STAGES = ("probe", "extract", "decode", "segment", "encode", "upload", "server", "download", "merge", "mux")
+
+# Process-wide totals per stage, exported as Prometheus counters
+_totals = {}
+_jobs = {}
+_totals_lock = threading.Lock()
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}".rstrip("0")
+
+
+def _stage_order(stage):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+class JobTimer:
+    """
+    Collects timed spans for one conversion job
+
+    Every span has a stage, a duration, and optionally the bytes and
+    milliseconds of audio it processed. Spans from concurrent segments
+    overlap, so per-stage totals can add up to more than the wall time.
+    """
+
+    def __init__(self, **job):
+        self.job = job
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.wall_seconds = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, bytes=0, audio_ms=0, segment=None, voice_id=None):
+        """Time the enclosed block as one span of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, bytes, audio_ms, segment, start, voice_id)
+
+    def record(self, stage, seconds, bytes=0, audio_ms=0, segment=None, start=None, voice_id=None):
+        """Add a span measured elsewhere (start is a time.perf_counter() value)"""
+        offset = (start if start is not None else time.perf_counter() - seconds) - self._start
+        span = {"stage": stage, "offset": round(offset, 4), "seconds": round(seconds, 4),
+                "bytes": bytes, "audio_ms": audio_ms}
+        if segment is not None:
+            span["segment"] = segment
+        if voice_id is not None:
+            span["voice_id"] = voice_id
+        with self._lock:
+            self.spans.append(span)
+        with _totals_lock:
+            totals = _totals.setdefault(stage, {"count": 0, "seconds": 0.0, "bytes": 0, "audio_ms": 0})
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["bytes"] += bytes
+            totals["audio_ms"] += audio_ms
+
+    def summary(self):
+        """Per-stage totals: {stage: {count, seconds, bytes, audio_s}}"""
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in sorted(spans, key=lambda s: _stage_order(s["stage"])):
+            totals = stages.setdefault(span["stage"], {"count": 0, "seconds": 0.0, "bytes": 0, "audio_s": 0.0})
+            totals["count"] += 1
+            totals["seconds"] += span["seconds"]
+            totals["bytes"] += span["bytes"]
+            totals["audio_s"] += span["audio_ms"] / 1000
+        for totals in stages.values():
+            totals["seconds"] = round(totals["seconds"], 3)
+            totals["audio_s"] = round(totals["audio_s"], 3)
+        return stages
+
+    def breakdown(self):
+        """Rows for display: stage, spans, seconds, share of all stage time, MB and audio throughput"""
+        stages = self.summary()
+        total = sum(s["seconds"] for s in stages.values()) or 1
+        rows = []
+        for stage, s in stages.items():
+            rows.append({
+                "stage": stage,
+                "spans": s["count"],
+                "seconds": s["seconds"],
+                "share": f"{s['seconds'] / total:.0%}",
+                "MB": round(s["bytes"] / 1e6, 2),
+                "MB/s": round(s["bytes"] / 1e6 / s["seconds"], 2) if s["seconds"] and s["bytes"] else None,
+                "x realtime": round(s["audio_s"] / s["seconds"], 1) if s["seconds"] and s["audio_s"] else None,
+            })
+        return rows
+
+    def finish(self, status="done"):
+        """Stop the wall clock, count the job and export it where configured"""
+        self.wall_seconds = time.perf_counter() - self._start
+        self.job["status"] = status
+        with _totals_lock:
+            _jobs[status] = _jobs.get(status, 0) + 1
+        export_job(self)
+        return self
+
+    def to_json_lines(self):
+        """One line per span, then a summary line for the whole job"""
+        lines = [json.dumps(dict(self.job, type="span", **span)) for span in self.spans]
+        lines.append(json.dumps(dict(self.job, type="job", started_at=self.started_at,
+                                     wall_seconds=round(self.wall_seconds or 0, 3), stages=self.summary())))
+        return "\n".join(lines) + "\n"
+
+
+def prometheus_text():
+    """Process-wide per-stage counters in the Prometheus text exposition format"""
+    with _totals_lock:
+        totals = {stage: dict(t) for stage, t in _totals.items()}
+        jobs = dict(_jobs)
+    metrics = (
+        ("elevenlabs_stage_spans_total", "Timed spans per pipeline stage", "count", 1),
+        ("elevenlabs_stage_seconds_total", "Seconds spent per pipeline stage", "seconds", 1),
+        ("elevenlabs_stage_bytes_total", "Bytes processed per pipeline stage", "bytes", 1),
+        ("elevenlabs_stage_audio_seconds_total", "Seconds of audio processed per pipeline stage", "audio_ms", 1000),
+    )
+    lines = []
+    for name, help_text, key, divisor in metrics:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for stage in sorted(totals, key=_stage_order):
+            lines.append(f'{name}{{stage="{stage}"}} {_format_value(totals[stage][key] / divisor)}')
+    lines += ["# HELP elevenlabs_jobs_total Finished conversion jobs by status", "# TYPE elevenlabs_jobs_total counter"]
+    lines += [f'elevenlabs_jobs_total{{status="{status}"}} {count}' for status, count in sorted(jobs.items())]
+    lines += _client_lines()
+    return "\n".join(lines) + "\n"
+
+
+def _client_lines():
+    # Counters of the shared API client and conversion cache, once they exist
+    from models.api_client import get_shared_client_metrics
+    from models.conversion_cache import get_default_cache
+    sources = []
+    api = get_shared_client_metrics()
+    if api is not None:
+        sources.append((api, (
+            ("elevenlabs_api_requests_total", "counter", "Speech-to-speech requests sent, retries included",
+             "requests"),
+            ("elevenlabs_api_retries_total", "counter", "Requests retried after a transient error", "retries"),
+            ("elevenlabs_api_failures_total", "counter", "Requests that failed with a transient error", "failures"),
+            ("elevenlabs_api_rate_limited_total", "counter", "Requests answered with 429", "rate_limited"),
+            ("elevenlabs_api_circuit_opens_total", "counter", "Times the circuit breaker opened", "circuit_opens"),
+            ("elevenlabs_api_throttled_seconds_total", "counter", "Seconds spent waiting for the rate limiter",
+             "throttled_seconds"),
+            ("elevenlabs_api_backoff_seconds_total", "counter", "Seconds spent backing off before retries",
+             "backoff_seconds"),
+            ("elevenlabs_api_rate_per_second", "gauge", "Current request rate allowed by the limiter",
+             "current_rate_per_s"),
+            ("elevenlabs_api_circuit_open", "gauge", "1 while the circuit breaker is open", "circuit_open"),
+        )))
+    cache = get_default_cache()
+    if cache is not None:
+        sources.append((cache.stats(), (
+            ("elevenlabs_cache_hits_total", "counter", "Conversions served from the cache", "hits"),
+            ("elevenlabs_cache_misses_total", "counter", "Conversions not found in the cache", "misses"),
+            ("elevenlabs_cache_evictions_total", "counter", "Cache entries evicted", "evictions"),
+            ("elevenlabs_cache_entries", "gauge", "Entries in the cache", "entries"),
+            ("elevenlabs_cache_bytes", "gauge", "Size of the cache in bytes", "bytes"),
+        )))
+    lines = []
+    for values, metrics in sources:
+        for name, metric_type, help_text, key in metrics:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}",
+                      f"{name} {_format_value(float(values[key]))}"]
+    return lines
+
+
+def export_job(timer):
+    """Append the job's spans to METRICS_LOG_PATH and rewrite METRICS_PROM_PATH, if configured"""
+    try:
+        if METRICS_LOG_PATH:
+            os.makedirs(os.path.dirname(METRICS_LOG_PATH) or ".", exist_ok=True)
+            with open(METRICS_LOG_PATH, "a") as f:
+                f.write(timer.to_json_lines())
+        if METRICS_PROM_PATH:
+            # Written atomically so a scraper (e.g. node_exporter's textfile collector) never sees half a file
+            os.makedirs(os.path.dirname(METRICS_PROM_PATH) or ".", exist_ok=True)
+            tmp_path = METRICS_PROM_PATH + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(prometheus_text())
+            os.replace(tmp_path, METRICS_PROM_PATH)
+    except OSError as e:
+        print(f"Could not export job metrics: {e}")
+
+
+class ReadTracker:
+    """
+    File-like wrapper around an upload buffer that notes when it was fully read
+
+    The HTTP client streams the request body from the buffer, so the time
+    of the last read marks roughly when the upload finished and the server
+    started working on it.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self.name = getattr(buffer, "name", "segment")
+        self.size = buffer.getbuffer().nbytes
+        self.finished_at = None
+
+    def read(self, size=-1):
+        data = self._buffer.read(size)
+        if self.finished_at is None and self._buffer.tell() >= self.size:
+            self.finished_at = time.perf_counter()
+        return data
+
+    def seek(self, offset, whence=0):
+        self.finished_at = None  # A retry sends the body again
+        return self._buffer.seek(offset, whence)
+
+    def __getattr__(self, name):
+        return getattr(self._buffer, name)
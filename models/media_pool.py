@@ -0,0 +1,144 @@
+import os
+import threading
+import multiprocessing
+from io import BytesIO
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import MEDIA_WORKERS
+
+# Encoding and decoding are CPU-bound (pydub/ffmpeg), so they can run in a pool
+# of worker processes. PCM goes to and from the workers through shared memory;
+# only small compressed buffers and metadata are pickled.
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def media_worker_count():
+    """Worker processes to use: MEDIA_WORKERS, or one per CPU core when it's 0"""
+    return MEDIA_WORKERS if MEDIA_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def get_media_pool():
+    """Process-wide pool for media transforms, or None when it's disabled (a single worker)"""
+    global _pool
+    workers = media_worker_count()
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: the app runs many threads, and forking those is unsafe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool():
+    # A worker died (e.g. killed for memory); the next task gets a fresh pool
+    global _pool
+    with _pool_lock:
+        broken, _pool = _pool, None
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _shared_copy(data):
+    """New shared memory block holding a copy of data"""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    shm.buf[:len(data)] = data
+    return shm
+
+
+def _encode_shared(shm_name, size, sample_width, frame_rate, channels, name, format, sample_rate, out_channels,
+                   bitrate):
+    # Runs in a worker process
+    from pydub import AudioSegment
+    from models.media_processor import encode_audio
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        audio = AudioSegment(data=bytes(shm.buf[:size]), sample_width=sample_width, frame_rate=frame_rate,
+                             channels=channels)
+    finally:
+        shm.close()
+    buffer = encode_audio(audio, name, format, sample_rate, out_channels, bitrate)
+    return buffer.getvalue(), buffer.name
+
+
+def _decode_shared(path):
+    # Runs in a worker process; the caller takes over (and unlinks) the shared memory block
+    from pydub import AudioSegment
+    audio = AudioSegment.from_file(path)
+    shm = _shared_copy(audio.raw_data)
+    shm.close()
+    return shm.name, len(audio.raw_data), audio.sample_width, audio.frame_rate, audio.channels
+
+
+class PoolTask:
+    """A transform running in the media pool; result() waits for it and frees its shared memory"""
+
+    def __init__(self, future, finish, shm=None):
+        self._future = future
+        self._finish = finish
+        self._shm = shm
+
+    def done(self):
+        return self._future.done()
+
+    def result(self):
+        try:
+            return self._finish(self._future.result())
+        except BrokenProcessPool:
+            _reset_pool()
+            raise
+        finally:
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+                self._shm = None
+
+
+def submit_encode(pool, audio, name, format, sample_rate=0, channels=0, bitrate=None):
+    """
+    Start encode_audio for a decoded AudioSegment in the pool
+
+    Returns:
+        PoolTask whose result() is the same named BytesIO encode_audio returns
+    """
+    shm = _shared_copy(audio.raw_data)
+    try:
+        future = pool.submit(_encode_shared, shm.name, len(audio.raw_data), audio.sample_width, audio.frame_rate,
+                             audio.channels, name, format, sample_rate, channels, bitrate)
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+
+    def finish(result):
+        data, buffer_name = result
+        buffer = BytesIO(data)
+        buffer.name = buffer_name
+        return buffer
+
+    return PoolTask(future, finish, shm)
+
+
+def submit_decode(pool, path):
+    """
+    Start decoding an audio file in the pool
+
+    Returns:
+        PoolTask whose result() is the decoded AudioSegment
+    """
+    from pydub import AudioSegment
+
+    def finish(result):
+        shm_name, size, sample_width, frame_rate, channels = result
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            data = bytes(shm.buf[:size])
+        finally:
+            shm.close()
+            shm.unlink()
+        return AudioSegment(data=data, sample_width=sample_width, frame_rate=frame_rate, channels=channels)
+
+    return PoolTask(pool.submit(_decode_shared, path), finish)
@@ -0,0 +1,111 @@
+import os
+import re
+import json
+import wave
+import shutil
+import subprocess
+import threading
+from models.ffmpeg_backend import find_ffmpeg
+
+_probe_cache = {}
+_probe_cache_lock = threading.Lock()
+
+
+class MediaProbeError(Exception):
+    """Raised when a file's duration and audio format can't be read"""
+
+
+def _probe_wav(path):
+    with wave.open(path, "rb") as f:
+        return {
+            "duration_ms": int(f.getnframes() * 1000 / f.getframerate()),
+            "sample_rate": f.getframerate(),
+            "channels": f.getnchannels(),
+            "has_video": False,
+        }
+
+
+def _probe_ffprobe(ffprobe, path):
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-show_format", "-show_streams", "-of", "json", path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise MediaProbeError(result.stderr.decode("utf-8", "replace").strip())
+    info = json.loads(result.stdout)
+    streams = info.get("streams", [])
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    duration = info.get("format", {}).get("duration") or (audio or {}).get("duration")
+    if duration is None:
+        raise MediaProbeError(f"No duration in container headers of {path}")
+    return {
+        "duration_ms": int(float(duration) * 1000),
+        "sample_rate": int(audio["sample_rate"]) if audio and audio.get("sample_rate") else None,
+        "channels": audio.get("channels") if audio else None,
+        "has_video": any(s.get("codec_type") == "video" for s in streams),
+    }
+
+
+def _probe_ffmpeg_banner(ffmpeg, path):
+    # Without ffprobe, `ffmpeg -i` prints the same header information to stderr
+    result = subprocess.run([ffmpeg, "-hide_banner", "-nostdin", "-i", path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    banner = result.stderr.decode("utf-8", "replace")
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", banner)
+    if not duration:
+        raise MediaProbeError(f"Could not read duration of {path}")
+    hours, minutes, seconds = duration.groups()
+    audio = re.search(r"Audio: [^\n]*?(\d+) Hz, ([^,\n]+)", banner)
+    channel_names = {"mono": 1, "stereo": 2}
+    channels = None
+    if audio:
+        layout = audio.group(2).strip()
+        channels = channel_names.get(layout) or (int(layout.split()[0]) if layout.split()[0].isdigit() else None)
+    return {
+        "duration_ms": int((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000),
+        "sample_rate": int(audio.group(1)) if audio else None,
+        "channels": channels,
+        "has_video": "Video:" in banner,
+    }
+
+
+def probe_media(path):
+    """
+    Read duration, sample rate and channel count from a media file's headers
+
+    Nothing is decoded, so this is fast even for multi-GB uploads. Results
+    are cached per file (path, size and modification time).
+
+    Returns:
+        dict with duration_ms, sample_rate, channels and has_video
+        (sample_rate/channels are None if the file has no audio stream)
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _probe_cache_lock:
+        if key in _probe_cache:
+            return dict(_probe_cache[key])
+
+    info = None
+    if path.lower().endswith(".wav"):
+        try:
+            info = _probe_wav(path)
+        except (wave.Error, EOFError):
+            pass  # Not plain PCM (e.g. float or extensible WAV); let ffmpeg read it
+    if info is None:
+        ffprobe = shutil.which("ffprobe")
+        if ffprobe:
+            info = _probe_ffprobe(ffprobe, path)
+        else:
+            ffmpeg = find_ffmpeg()
+            if not ffmpeg:
+                raise MediaProbeError("Neither ffprobe nor ffmpeg is available")
+            info = _probe_ffmpeg_banner(ffmpeg, path)
+
+    with _probe_cache_lock:
+        _probe_cache[key] = info
+    return dict(info)
+
+
+def probe_duration_ms(path):
+    """Duration of a media file in milliseconds, from its headers"""
+    return probe_media(path)["duration_ms"]
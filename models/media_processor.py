@@ -1,9 +1,23 @@
-from pydub import AudioSegment
 import os
-import tempfile
+from io import BytesIO
+from models import ffmpeg_backend
+from config import (
+    SILENCE_AWARE_SEGMENTS, SEGMENT_CUT_TOLERANCE_MS, SILENCE_THRESHOLD_DB, MIN_SKIPPED_SILENCE_MS,
+    SEGMENT_CROSSFADE_MS, UPLOAD_FORMAT, UPLOAD_SAMPLE_RATE, UPLOAD_CHANNELS, UPLOAD_BITRATE,
+    PREVIEW_DURATION_MS, PREVIEW_SCAN_MS,
+)
 
-# Use the correct import structure for MoviePy < 2.0.0
-from moviepy.editor import VideoFileClip, AudioFileClip
+# Upload encodings: pydub/ffmpeg container, codec, file extension, and whether a bitrate applies
+UPLOAD_ENCODINGS = {
+    "wav": {"format": "wav", "codec": None, "ext": "wav", "bitrate": False},
+    "flac": {"format": "flac", "codec": "flac", "ext": "flac", "bitrate": False},
+    "mp3": {"format": "mp3", "codec": "libmp3lame", "ext": "mp3", "bitrate": True},
+    "opus": {"format": "ogg", "codec": "libopus", "ext": "ogg", "bitrate": True},
+}
+OPUS_SAMPLE_RATES = (48000, 24000, 16000, 12000, 8000)
+
+# pydub, NumPy and MoviePy are imported inside the functions that use them, so
+# importing this module (and starting the app) doesn't pay for loading them.
 
 def is_video_file(file_path):
     """Determine if the file is a video based on extension"""
@@ -13,13 +27,23 @@ def is_video_file(file_path):
 
 def load_audio(file_path):
     """Load audio file"""
+    from pydub import AudioSegment
     return AudioSegment.from_file(file_path)
 
-def extract_audio_from_video(video_path):
-    """Extract audio from video file"""
+def extract_audio_from_video(video_path, work_dir=None):
+    """Extract audio from video file (ffmpeg directly, MoviePy as a fallback), next to it or into work_dir"""
     temp_audio_path = video_path + "_extracted_audio.wav"
+    if work_dir:
+        temp_audio_path = os.path.join(work_dir, os.path.basename(temp_audio_path))
+    try:
+        return ffmpeg_backend.extract_audio(video_path, temp_audio_path)
+    except ffmpeg_backend.FFmpegError as e:
+        print(f"ffmpeg audio extraction failed, falling back to MoviePy: {e}")
+    # Use the correct import structure for MoviePy < 2.0.0
+    from moviepy.editor import VideoFileClip
     video = VideoFileClip(video_path)
     video.audio.write_audiofile(temp_audio_path)
+    video.close()
     return temp_audio_path
 
 def segment_media(file_path, segment_duration_ms=4*60*1000):
@@ -32,33 +56,207 @@ def segment_media(file_path, segment_duration_ms=4*60*1000):
         # For audio files
         return segment_audio(file_path, segment_duration_ms), False
 
-def segment_audio(file_path, segment_duration_ms=4*60*1000):
-    """Split audio into segments"""
+def segment_boundaries(total_length_ms, segment_duration_ms=4*60*1000):
+    """List of (start_ms, end_ms) for fixed-length segments covering the audio"""
+    return [(start, min(start + segment_duration_ms, total_length_ms))
+            for start in range(0, total_length_ms, segment_duration_ms)]
+
+def plan_segments(audio, segment_duration_ms=4*60*1000):
+    """
+    Segment boundaries for a decoded AudioSegment
+
+    Uses silence-aware cuts (see models.segment_planner) unless disabled in
+    config, in which case the audio is cut at fixed offsets. Silent gaps
+    between the returned boundaries are not meant to be converted. With
+    SEGMENT_CROSSFADE_MS set, adjacent segments share an overlapping margin.
+    """
+    if not SILENCE_AWARE_SEGMENTS:
+        boundaries = segment_boundaries(len(audio), segment_duration_ms)
+    else:
+        from models.segment_planner import plan_audio_boundaries
+        boundaries = plan_audio_boundaries(
+            audio, segment_duration_ms,
+            tolerance_ms=SEGMENT_CUT_TOLERANCE_MS,
+            silence_db=SILENCE_THRESHOLD_DB,
+            min_silence_ms=MIN_SKIPPED_SILENCE_MS,
+        )
+    return overlap_boundaries(boundaries, SEGMENT_CROSSFADE_MS)
+
+def overlap_boundaries(boundaries, overlap_ms):
+    """
+    Extend each segment that directly follows another back by overlap_ms
+
+    The shared margin is converted twice, giving the merge real audio on
+    both sides of the seam to crossfade over.
+    """
+    overlapped = []
+    for i, (start, end) in enumerate(boundaries):
+        if i > 0 and overlap_ms and start == boundaries[i - 1][1]:
+            start = max(boundaries[i - 1][0], start - overlap_ms)
+        overlapped.append((start, end))
+    return overlapped
+
+def encode_audio(audio, name, format=UPLOAD_FORMAT, sample_rate=UPLOAD_SAMPLE_RATE,
+                 channels=UPLOAD_CHANNELS, bitrate=UPLOAD_BITRATE):
+    """
+    Encode an AudioSegment into an in-memory buffer ready for upload
+
+    Args:
+        audio: Decoded AudioSegment
+        name: Base file name; the encoding's extension is appended
+        format: One of UPLOAD_ENCODINGS (wav, flac, mp3, opus)
+        sample_rate: Target sample rate, or 0 to keep the source rate
+        channels: Target channel count (1 downmixes to mono), or 0 to keep
+        bitrate: Bitrate for lossy encodings, e.g. "64k"
+
+    Returns:
+        BytesIO positioned at 0 with a `name` attribute such as "segment_0.mp3"
+    """
+    if format not in UPLOAD_ENCODINGS:
+        raise ValueError(f"Unknown upload format {format!r}; expected one of {', '.join(UPLOAD_ENCODINGS)}")
+    encoding = UPLOAD_ENCODINGS[format]
+    if channels and audio.channels != channels:
+        audio = audio.set_channels(channels)
+    export_kwargs = {"format": encoding["format"]}
+    if encoding["codec"]:
+        # ffmpeg does the resampling (better anti-aliasing than pydub's) while encoding
+        rate = sample_rate or audio.frame_rate
+        if format == "opus" and rate not in OPUS_SAMPLE_RATES:
+            rate = 48000
+        export_kwargs["codec"] = encoding["codec"]
+        export_kwargs["parameters"] = ["-ar", str(rate)]
+        if encoding["bitrate"] and bitrate:
+            export_kwargs["bitrate"] = bitrate
+    elif sample_rate and audio.frame_rate != sample_rate:
+        audio = audio.set_frame_rate(sample_rate)
+    buffer = BytesIO()
+    audio.export(buffer, **export_kwargs)
+    buffer.seek(0)
+    buffer.name = f"{name}.{encoding['ext']}"
+    return buffer
+
+def load_excerpt(file_path, duration_ms=PREVIEW_DURATION_MS, scan_ms=PREVIEW_SCAN_MS):
+    """
+    Pick and decode a short, speech-dense excerpt of an audio or video file
+
+    The first scan_ms of the audio track is decoded at 8 kHz mono to find
+    the duration_ms stretch with the most non-silent 50 ms windows; only
+    that stretch is then decoded at full quality. Video is never decoded.
+
+    Returns:
+        (start_ms, AudioSegment)
+    """
+    import numpy as np
+    from pydub import AudioSegment
+    from models.media_probe import probe_media
+    from models.segment_planner import frame_rms_db, best_excerpt
+
+    samples = np.frombuffer(ffmpeg_backend.decode_pcm(file_path, 8000, 1, 0, scan_ms), dtype=np.int16)
+    start_ms = 0
+    if len(samples):
+        levels_db = frame_rms_db(samples, 1, 8000, 32768, window_ms=50)
+        start_ms = best_excerpt(levels_db, 50, duration_ms, SILENCE_THRESHOLD_DB)
+
+    info = probe_media(file_path)
+    frame_rate, channels = info["sample_rate"] or 44100, info["channels"] or 2
+    data = ffmpeg_backend.decode_pcm(file_path, frame_rate, channels, start_ms, duration_ms)
+    return start_ms, AudioSegment(data=data, sample_width=2, frame_rate=frame_rate, channels=channels)
+
+def split_audio(audio, boundaries, format="wav", indices=None, sample_rate=0, channels=0, bitrate=None, pool=None):
+    """
+    Yield (index, buffer) for each segment of an already decoded AudioSegment
+
+    Args:
+        audio: Decoded AudioSegment
+        boundaries: List of (start_ms, end_ms), e.g. from segment_boundaries
+        format: Encoding of the yielded buffers (see UPLOAD_ENCODINGS)
+        indices: Optional collection of segment indices to export; others are skipped
+        sample_rate, channels, bitrate: Passed to encode_audio; by default
+            the source rate and channels are kept
+        pool: Optional media pool (see models.media_pool); segments are then
+            encoded in parallel, as many ahead as it has workers, and still
+            yielded in order
+    """
+    wanted = [(index, start, end) for index, (start, end) in enumerate(boundaries)
+              if indices is None or index in indices]
+    if pool is None:
+        for index, start, end in wanted:
+            yield index, encode_audio(audio[start:end], f"segment_{index}", format, sample_rate, channels, bitrate)
+        return
+
+    from collections import deque
+    from models.media_pool import submit_encode, media_worker_count
+    pending = deque()
+    try:
+        for index, start, end in wanted:
+            pending.append((index, submit_encode(pool, audio[start:end], f"segment_{index}", format, sample_rate,
+                                                 channels, bitrate)))
+            if len(pending) >= media_worker_count():
+                index, task = pending.popleft()
+                yield index, task.result()
+        while pending:
+            index, task = pending.popleft()
+            yield index, task.result()
+    finally:
+        # Stopped early (error or cancel): wait for the rest so their shared memory is freed
+        for _, task in pending:
+            try:
+                task.result()
+            except Exception:
+                pass
+
+def iter_audio_segments(file_path, segment_duration_ms=4*60*1000, format="wav"):
+    """
+    Decode audio once and yield each slice as an encoded in-memory buffer
+
+    Yields:
+        BytesIO objects positioned at 0, with a `name` attribute such as
+        "segment_0.wav" so they can be uploaded directly to the API
+    """
     audio = load_audio(file_path)
+    for _, buffer in split_audio(audio, segment_boundaries(len(audio), segment_duration_ms), format):
+        yield buffer
+
+def segment_audio(file_path, segment_duration_ms=4*60*1000):
+    """Split audio into segment files (file-path wrapper around iter_audio_segments)"""
     segments = []
-    total_length = len(audio)
-    for i in range(0, total_length, segment_duration_ms):
-        segment = audio[i:i+segment_duration_ms]
-        segment_path = file_path.replace(".", f"_segment_{i//segment_duration_ms}.")
-        segment.export(segment_path, format="wav")
+    for index, buffer in enumerate(iter_audio_segments(file_path, segment_duration_ms)):
+        segment_path = file_path.replace(".", f"_segment_{index}.")
+        with open(segment_path, "wb") as f:
+            f.write(buffer.getbuffer())
         segments.append(segment_path)
     return segments
 
-def merge_audio(segments, output_path):
-    """Merge audio segments back together"""
-    combined = AudioSegment.empty()
-    for seg in segments:
-        audio_seg = AudioSegment.from_file(seg)
-        combined += audio_seg
-    combined.export(output_path, format="wav")
+def merge_audio(segments, output_path, cleanup=True, boundaries=None, total_length_ms=None, crossfade_ms=0):
+    """
+    Merge audio segments back together (and delete the segment files unless cleanup=False)
+
+    With boundaries, each segment is placed at its original start time and
+    skipped gaps are filled with silence, padded out to total_length_ms.
+    Where segments overlap, crossfade_ms sets an equal-power crossfade.
+    """
+    from models.merge_engine import merge_segments
+    merge_segments(segments, output_path, boundaries, total_length_ms, crossfade_ms)
     # Clean up temporary segment files
-    for seg in segments:
-        if os.path.exists(seg):
-            os.remove(seg)
+    if cleanup:
+        for seg in segments:
+            if os.path.exists(seg):
+                os.remove(seg)
     return output_path
 
 def replace_video_audio(video_path, new_audio_path, output_path):
-    """Replace the audio in a video with processed audio"""
+    """
+    Replace the audio in a video with processed audio
+
+    Remuxes with ffmpeg, copying the video stream untouched. Only if the
+    container can't take the stream as-is does this fall back to MoviePy,
+    which re-encodes the whole video.
+    """
+    try:
+        return ffmpeg_backend.remux_audio(video_path, new_audio_path, output_path)
+    except ffmpeg_backend.FFmpegError as e:
+        print(f"ffmpeg remux failed, falling back to MoviePy re-encode: {e}")
+    from moviepy.editor import VideoFileClip, AudioFileClip
     video = VideoFileClip(video_path)
     new_audio = AudioFileClip(new_audio_path)
     video = video.set_audio(new_audio)
@@ -0,0 +1,267 @@
+import os
+import wave
+import numpy as np
+from pydub import AudioSegment
+from models.segment_planner import samples_array
+
+
+def ms_to_frames(ms, frame_rate):
+    return int(round(ms * frame_rate / 1000))
+
+
+def equal_power_crossfade(tail, head):
+    """Blend two equally long (frames, channels) arrays with cos/sin gain curves"""
+    t = (np.arange(len(head), dtype=np.float32) + 0.5) / len(head)
+    fade_out = np.cos(t * np.pi / 2)[:, None]
+    fade_in = np.sin(t * np.pi / 2)[:, None]
+    return tail.astype(np.float32) * fade_out + head.astype(np.float32) * fade_in
+
+
+class PCMBuffer:
+    """
+    Preallocated interleaved PCM output that decoded segments are written into
+
+    Sized up front from the planned duration, so adding a segment costs
+    only that segment's samples, unlike repeated AudioSegment +=, which
+    copies everything merged so far.
+    """
+
+    def __init__(self, frame_rate, channels, sample_width, length_ms=0):
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.dtype = {1: np.int8, 2: np.int16, 4: np.int32}[sample_width]
+        self.samples = np.zeros((ms_to_frames(length_ms, frame_rate), channels), dtype=self.dtype)
+        self.length = 0  # Frames written so far (end of the furthest segment)
+
+    def _reserve(self, frames):
+        if frames > len(self.samples):
+            # Only happens when the planned size was unknown or too small
+            extra = max(frames - len(self.samples), len(self.samples) // 2)
+            self.samples = np.concatenate([self.samples, np.zeros((extra, self.channels), dtype=self.dtype)])
+
+    def write(self, audio, start_ms=None, crossfade_ms=0):
+        """
+        Write a decoded AudioSegment into place
+
+        Args:
+            audio: Decoded segment (converted to this buffer's format if needed)
+            start_ms: Where the segment starts; defaults to right after the
+                previous one (pulled back by crossfade_ms to overlap it)
+            crossfade_ms: Length of the equal-power crossfade applied where
+                the segment overlaps audio already in the buffer
+        """
+        audio = audio.set_frame_rate(self.frame_rate).set_channels(self.channels).set_sample_width(self.sample_width)
+        data = samples_array(audio).reshape(-1, self.channels)
+        crossfade = ms_to_frames(crossfade_ms, self.frame_rate)
+        if start_ms is None:
+            start = max(0, self.length - crossfade)
+        else:
+            start = ms_to_frames(start_ms, self.frame_rate)
+        end = start + len(data)
+        self._reserve(end)
+
+        overlap = max(0, min(self.length - start, crossfade, len(data)))
+        if overlap:
+            info = np.iinfo(self.dtype)
+            mixed = equal_power_crossfade(self.samples[start:start + overlap], data[:overlap])
+            self.samples[start:start + overlap] = np.clip(mixed, info.min, info.max).astype(self.dtype)
+        self.samples[start + overlap:end] = data[overlap:]
+        self.length = max(self.length, end)
+
+    def export_wav(self, output_path, length_ms=None):
+        """Write the buffer as a WAV file in a single pass"""
+        length = max(self.length, ms_to_frames(length_ms or 0, self.frame_rate))
+        self._reserve(length)
+        with wave.open(output_path, "wb") as f:
+            f.setnchannels(self.channels)
+            f.setsampwidth(self.sample_width)
+            f.setframerate(self.frame_rate)
+            f.writeframes(memoryview(np.ascontiguousarray(self.samples[:length])).cast("B"))
+        return output_path
+
+
+class WavStreamWriter:
+    """
+    Writes segments placed on a timeline straight to a WAV file
+
+    Only the last hold_ms of output is kept in memory (so the next segment
+    can be crossfaded into it); everything before that is already on disk.
+    Memory use is independent of the output length, unlike PCMBuffer.
+    Segments must arrive in timeline order.
+    """
+
+    def __init__(self, output_path, hold_ms=0):
+        self.output_path = output_path
+        self.hold_ms = hold_ms
+        self._wav = None
+        self.written = 0  # Frames on disk
+        self.tail = None  # Frames after those, still open to crossfading
+
+    def _open(self, audio):
+        self.frame_rate = audio.frame_rate
+        self.channels = audio.channels
+        self.sample_width = audio.sample_width
+        self.dtype = {1: np.int8, 2: np.int16, 4: np.int32}[audio.sample_width]
+        self.tail = np.zeros((0, self.channels), dtype=self.dtype)
+        self._wav = wave.open(self.output_path, "wb")
+        self._wav.setnchannels(self.channels)
+        self._wav.setsampwidth(self.sample_width)
+        self._wav.setframerate(self.frame_rate)
+
+    @property
+    def length(self):
+        return self.written + len(self.tail)
+
+    def _flush(self, keep=0):
+        cut = max(0, len(self.tail) - keep)
+        if cut:
+            self._wav.writeframes(memoryview(np.ascontiguousarray(self.tail[:cut])).cast("B"))
+            self.written += cut
+            self.tail = self.tail[cut:]
+
+    def _write_silence(self, frames, chunk_frames=1 << 20):
+        # Long skipped silences are written in chunks rather than allocated at once
+        self._flush()
+        while frames > 0:
+            count = min(frames, chunk_frames)
+            self._wav.writeframes(bytes(count * self.channels * self.sample_width))
+            self.written += count
+            frames -= count
+
+    def write(self, audio, start_ms=None, crossfade_ms=0):
+        """Same placement and crossfade rules as PCMBuffer.write"""
+        if self._wav is None:
+            self._open(audio)
+        audio = audio.set_frame_rate(self.frame_rate).set_channels(self.channels).set_sample_width(self.sample_width)
+        data = samples_array(audio).reshape(-1, self.channels)
+        crossfade = ms_to_frames(crossfade_ms, self.frame_rate)
+        if start_ms is None:
+            start = max(0, self.length - crossfade)
+        else:
+            start = ms_to_frames(start_ms, self.frame_rate)
+        if start > self.length:
+            self._write_silence(start - self.length)
+        # Audio already on disk can't be revisited; anything overlapping it is dropped
+        if start < self.written:
+            data = data[self.written - start:]
+            start = self.written
+
+        offset = start - self.written
+        overlap = max(0, min(len(self.tail) - offset, crossfade, len(data)))
+        head = self.tail[:offset]
+        if overlap:
+            info = np.iinfo(self.dtype)
+            mixed = equal_power_crossfade(self.tail[offset:offset + overlap], data[:overlap])
+            head = np.concatenate([head, np.clip(mixed, info.min, info.max).astype(self.dtype)])
+        self.tail = np.concatenate([head, data[overlap:]])
+        self._flush(keep=ms_to_frames(self.hold_ms, self.frame_rate))
+
+    def finish(self, length_ms=None):
+        """Pad to length_ms with silence, write everything out and close the file"""
+        if self._wav is None:
+            self._open(AudioSegment.silent(duration=0, frame_rate=44100))
+        self._flush()
+        missing = ms_to_frames(length_ms or 0, self.frame_rate) - self.written
+        if missing > 0:
+            self._write_silence(missing)
+        self._wav.close()
+        return self.output_path
+
+
+class OrderedMerger:
+    """
+    Merges converted segments as they arrive, in any order
+
+    Segments are decoded and written into the output buffer in index order
+    as soon as every earlier segment is in, so merging overlaps with the
+    conversions still in flight instead of waiting for the last one. With
+    a media pool, each segment starts decoding in a worker process as soon
+    as it's added, and add() never waits for a decode: finished ones are
+    written on later calls, the rest by finish().
+    """
+
+    def __init__(self, boundaries=None, total_length_ms=None, crossfade_ms=0, stream_to=None, pool=None):
+        self.boundaries = boundaries
+        self.total_length_ms = total_length_ms
+        self.crossfade_ms = crossfade_ms
+        # With stream_to, segments go straight to that WAV file instead of a buffer sized for the whole output
+        self.stream_to = stream_to
+        self.buffer = WavStreamWriter(stream_to, crossfade_ms) if stream_to else None
+        self.pool = pool
+        self.next_index = 0
+        self._waiting = {}
+
+    def add(self, index, segment_path):
+        """Hand over segment index; it's merged once all segments before it are"""
+        if self.pool is not None:
+            from models.media_pool import submit_decode
+            self._waiting[index] = submit_decode(self.pool, segment_path)
+        else:
+            self._waiting[index] = segment_path
+        self._write_ready(wait=False)
+
+    def _write_ready(self, wait):
+        while self.next_index in self._waiting:
+            segment = self._waiting[self.next_index]
+            if not wait and not isinstance(segment, str) and not segment.done():
+                break
+            self._write(self._waiting.pop(self.next_index))
+            self.next_index += 1
+
+    def _write(self, segment):
+        audio = AudioSegment.from_file(segment) if isinstance(segment, str) else segment.result()
+        if self.buffer is None:
+            planned_ms = self.total_length_ms or 0
+            if self.boundaries:
+                planned_ms = max(planned_ms, self.boundaries[-1][1])
+            self.buffer = PCMBuffer(audio.frame_rate, audio.channels, audio.sample_width, planned_ms)
+        start_ms = self.boundaries[self.next_index][0] if self.boundaries else None
+        self.buffer.write(audio, start_ms, self.crossfade_ms)
+
+    def finish(self, output_path):
+        """Export the merged audio; every segment must have been added"""
+        self._write_ready(wait=True)
+        if self._waiting:
+            raise ValueError(f"Segment {self.next_index} is missing; cannot merge later segments")
+        if self.stream_to:
+            self.buffer.finish(self.total_length_ms)
+            if output_path != self.stream_to:
+                os.replace(self.stream_to, output_path)
+            return output_path
+        if self.buffer is None:
+            self.buffer = PCMBuffer(44100, 1, 2, self.total_length_ms or 0)
+        return self.buffer.export_wav(output_path, self.total_length_ms)
+
+    def discard(self):
+        """Drop a merge that won't be finished, removing its partly written file"""
+        for segment in self._waiting.values():
+            if not isinstance(segment, str):
+                try:
+                    segment.result()  # Frees its shared memory
+                except Exception:
+                    pass
+        self._waiting.clear()
+        if self.stream_to and self.buffer._wav is not None:
+            self.buffer._wav.close()
+        if self.stream_to and os.path.exists(self.stream_to):
+            os.remove(self.stream_to)
+
+
+def merge_segments(segments, output_path, boundaries=None, total_length_ms=None, crossfade_ms=0, pool=None):
+    """
+    Merge audio segment files into one WAV through a preallocated PCM buffer
+
+    Args:
+        segments: Segment file paths in playback order
+        output_path: Where to write the merged WAV
+        boundaries: Optional (start_ms, end_ms) per segment; segments are placed
+            at their start and gaps stay silent
+        total_length_ms: Optional minimum length of the output
+        crossfade_ms: Equal-power crossfade over overlapping segment margins
+        pool: Optional media pool to decode the segments in parallel
+    """
+    merger = OrderedMerger(boundaries, total_length_ms, crossfade_ms, pool=pool)
+    for i, seg in enumerate(segments):
+        merger.add(i, seg)
+    return merger.finish(output_path)
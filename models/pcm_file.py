@@ -0,0 +1,94 @@
+import os
+import tempfile
+import threading
+import numpy as np
+from pydub import AudioSegment
+from models import ffmpeg_backend
+from models.media_probe import probe_media
+
+
+class PCMFileAudio:
+    """
+    Decoded audio kept in a raw 16-bit PCM file on disk and read in windows
+
+    Stands in for a pydub AudioSegment where the pipeline only needs its
+    length, format and slices: audio[start_ms:end_ms] reads just that
+    stretch from disk, so memory use doesn't grow with the input length.
+    """
+
+    sample_width = 2
+
+    def __init__(self, path, frame_rate, channels, delete=False):
+        self.path = path
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.frame_width = channels * self.sample_width
+        self.frame_count = os.path.getsize(path) // self.frame_width
+        self.delete = delete
+        self._file = open(path, "rb")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def decode(cls, input_path, frame_rate=None, channels=None, work_dir=None):
+        """
+        Decode the first audio stream of any media file with ffmpeg into a temporary PCM file
+
+        Args:
+            input_path: Audio or video file
+            frame_rate, channels: Resample/downmix while decoding (default: keep the source's)
+            work_dir: Directory for the temporary file (default: the system temp directory)
+        """
+        if not frame_rate or not channels:
+            info = probe_media(input_path)
+            frame_rate = frame_rate or info["sample_rate"] or 44100
+            channels = channels or info["channels"] or 2
+        fd, path = tempfile.mkstemp(suffix=".pcm", dir=work_dir)
+        os.close(fd)
+        try:
+            ffmpeg_backend.run_ffmpeg([
+                "-i", input_path, "-vn", "-map", "0:a:0",
+                "-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(frame_rate), "-ac", str(channels), path,
+            ])
+        except Exception:
+            os.remove(path)
+            raise
+        return cls(path, frame_rate, channels, delete=True)
+
+    @property
+    def max_possible_amplitude(self):
+        return 2 ** (8 * self.sample_width - 1)
+
+    def __len__(self):
+        return int(round(self.frame_count * 1000 / self.frame_rate))
+
+    def _ms_to_frame(self, ms, default):
+        if ms is None:
+            return default
+        if ms < 0:
+            ms += len(self)
+        return min(self.frame_count, max(0, int(round(ms * self.frame_rate / 1000))))
+
+    def read_frames(self, start, count):
+        """Raw interleaved bytes of count frames starting at frame start"""
+        with self._lock:
+            self._file.seek(start * self.frame_width)
+            return self._file.read(max(0, count) * self.frame_width)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError("PCMFileAudio only supports slicing by milliseconds, e.g. audio[1000:5000]")
+        start = self._ms_to_frame(item.start, 0)
+        end = self._ms_to_frame(item.stop, self.frame_count)
+        return AudioSegment(data=self.read_frames(start, end - start), sample_width=self.sample_width,
+                            frame_rate=self.frame_rate, channels=self.channels)
+
+    def iter_samples(self, block_frames):
+        """Interleaved int16 samples as NumPy arrays of up to block_frames frames each"""
+        for start in range(0, self.frame_count, block_frames):
+            yield np.frombuffer(self.read_frames(start, block_frames), dtype=np.int16)
+
+    def close(self):
+        """Close the file, removing it if it was decoded by this object"""
+        self._file.close()
+        if self.delete and os.path.exists(self.path):
+            os.remove(self.path)
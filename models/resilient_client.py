@@ -0,0 +1,250 @@
+import time
+import random
+import threading
+from config import (
+    API_RATE_LIMIT_PER_S,
+    API_RATE_BURST,
+    API_MAX_RETRIES,
+    API_BACKOFF_BASE_S,
+    API_BACKOFF_MAX_S,
+    API_CIRCUIT_FAILURE_THRESHOLD,
+    API_CIRCUIT_RESET_S,
+)
+
+# Error messages that mean "try again", whatever exception type carries them
+TRANSIENT_MESSAGES = ("server disconnected", "connection reset", "connection aborted", "timed out", "temporarily unavailable")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+
+def error_status_code(error):
+    """HTTP status of an SDK ApiError (or similar), if any"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_transient_error(error):
+    """True for errors worth retrying: 429, 5xx, dropped connections and timeouts"""
+    status = error_status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # httpx (which the SDK uses) raises its own connect, timeout and protocol errors,
+    # all TransportError subclasses; matched by name so httpx isn't imported here
+    if any(cls.__name__ == "TransportError" and cls.__module__.startswith("httpx") for cls in type(error).__mro__):
+        return True
+    message = str(error).lower()
+    return any(text in message for text in TRANSIENT_MESSAGES)
+
+
+def retry_after_seconds(error):
+    """Delay requested by a Retry-After header, if the error carries one"""
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting request starts
+
+    The refill rate adapts: it halves when the API answers 429 and creeps
+    back up towards max_rate as requests succeed.
+    """
+
+    def __init__(self, max_rate, capacity, min_rate=0.1):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class CircuitBreaker:
+    """Stops calling the API after repeated failures, then lets one trial request through after reset_s"""
+
+    def __init__(self, failure_threshold, reset_s):
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_s or self.trial_in_flight:
+                raise CircuitOpenError("ElevenLabs API is failing repeatedly; pausing requests. Please try again later.")
+            self.trial_in_flight = True  # Half-open: allow a single trial request
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """
+        End a trial request that told nothing about the API's health (e.g. a
+        request the API rejected as invalid), so the next request can be the trial
+        """
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        """Count a failure; returns True if this failure opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            was_trial = self.trial_in_flight
+            self.trial_in_flight = False
+            if was_trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class ResilientSpeechToSpeech:
+    """speech_to_speech.convert with rate limiting, retries and a circuit breaker"""
+
+    def __init__(self, inner, owner):
+        self._inner = inner
+        self._owner = owner
+
+    def convert(self, **kwargs):
+        return self._owner.convert_with_retries(self._inner.convert, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+
+class ResilientClient:
+    """
+    Wraps an ElevenLabs client (or a compatible fake)
+
+    speech_to_speech.convert gets a token-bucket limiter shared by every
+    caller, retries with jittered exponential backoff for transient errors,
+    and a circuit breaker. Everything else is passed straight through.
+    """
+
+    def __init__(self, client, rate=API_RATE_LIMIT_PER_S, burst=API_RATE_BURST, max_retries=API_MAX_RETRIES,
+                 backoff_base_s=API_BACKOFF_BASE_S, backoff_max_s=API_BACKOFF_MAX_S,
+                 failure_threshold=API_CIRCUIT_FAILURE_THRESHOLD, reset_s=API_CIRCUIT_RESET_S, sleep=time.sleep):
+        self.client = client
+        self.limiter = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_s)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._sleep = sleep
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "circuit_opens": 0,
+            "throttled_seconds": 0.0,
+            "backoff_seconds": 0.0,
+        }
+        self.speech_to_speech = ResilientSpeechToSpeech(client.speech_to_speech, self)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _count(self, key, amount=1):
+        with self._metrics_lock:
+            self.metrics[key] += amount
+
+    def backoff_delay(self, attempt, error):
+        """Full-jitter exponential backoff, honouring Retry-After when given"""
+        requested = retry_after_seconds(error)
+        if requested is not None:
+            return min(requested, self.backoff_max_s)
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+
+    def convert_with_retries(self, convert, kwargs):
+        """
+        Call convert(**kwargs) and yield its chunks, retrying transient failures
+
+        Retries happen only before the first chunk arrives (that's when 429s,
+        5xx and dropped connections surface); an error mid-stream is raised,
+        since part of the audio has already been handed to the caller.
+        """
+        audio = kwargs.get("audio")
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            self._count("throttled_seconds", self.limiter.acquire())
+            self._count("requests")
+            if hasattr(audio, "seek"):
+                audio.seek(0)
+            try:
+                chunks = iter(convert(**kwargs))
+                first = next(chunks, None)
+            except Exception as e:
+                if not is_transient_error(e):
+                    self.breaker.release_trial()
+                    raise
+                self._count("failures")
+                if error_status_code(e) == 429:
+                    self._count("rate_limited")
+                    self.limiter.penalize()
+                if self.breaker.record_failure():
+                    self._count("circuit_opens")
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                self._count("retries")
+                self._count("backoff_seconds", delay)
+                self._sleep(delay)
+                attempt += 1
+                continue
+
+            self.breaker.record_success()
+            self.limiter.reward()
+            if first is not None:
+                yield first
+            yield from chunks
+            return
+
+    def get_metrics(self):
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        metrics["current_rate_per_s"] = round(self.limiter.rate, 3)
+        metrics["circuit_open"] = self.breaker.opened_at is not None
+        return metrics
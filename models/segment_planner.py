@@ -0,0 +1,133 @@
+import numpy as np
+
+# Samples per analysis block; bounds the float copy made while computing RMS
+RMS_BLOCK_WINDOWS = 10000
+
+
+def samples_array(audio):
+    """Interleaved samples of a pydub AudioSegment as a NumPy view (no copy)"""
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[audio.sample_width]
+    return np.frombuffer(audio.raw_data, dtype=dtype)
+
+
+def frame_rms_db(samples, channels, frame_rate, max_amplitude, window_ms=10):
+    """
+    RMS level in dBFS of consecutive window_ms windows, in a single pass
+
+    The array is processed in blocks so multi-hour inputs never need a
+    full-size float copy.
+    """
+    window = max(1, frame_rate * window_ms // 1000) * channels
+    n_windows = -(-len(samples) // window)
+    levels = np.empty(n_windows, dtype=np.float32)
+    block = window * RMS_BLOCK_WINDOWS
+    for offset in range(0, len(samples), block):
+        chunk = samples[offset:offset + block].astype(np.float32)
+        full = len(chunk) // window * window
+        first = offset // window
+        if full:
+            frames = chunk[:full].reshape(-1, window)
+            levels[first:first + len(frames)] = np.sqrt(np.mean(frames * frames, axis=1))
+        if full < len(chunk):
+            tail = chunk[full:]
+            levels[-1] = np.sqrt(np.mean(tail * tail))
+    return 20 * np.log10(levels / max_amplitude + 1e-10)
+
+
+def silent_runs(levels_db, silence_db, min_windows):
+    """(start, end) window indices of silent stretches at least min_windows long"""
+    silent = np.concatenate(([False], levels_db < silence_db, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) >= min_windows
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+def plan_boundaries(levels_db, window_ms, total_length_ms, target_ms, tolerance_ms,
+                    silence_db=-45.0, min_silence_ms=2000, padding_ms=200):
+    """
+    Choose segment boundaries at the quietest points near each target length
+
+    Args:
+        levels_db: Per-window levels from frame_rms_db
+        window_ms: Window length used for levels_db
+        total_length_ms: Length of the audio
+        target_ms: Maximum segment length
+        tolerance_ms: How far before the target length a cut may be moved
+        silence_db: Level below which a window counts as silent
+        min_silence_ms: Silent stretches at least this long are skipped entirely
+        padding_ms: Audio kept on each side of a skipped stretch so speech
+            onsets and tails aren't clipped
+
+    Returns:
+        List of (start_ms, end_ms); gaps between them are silence that does
+        not need converting
+    """
+    target = max(1, int(target_ms // window_ms))
+    tolerance = min(int(tolerance_ms // window_ms), target // 2)
+    padding = int(padding_ms // window_ms)
+    n_windows = len(levels_db)
+
+    # Speech regions are whatever lies between long silences
+    regions = []
+    position = 0
+    for start, end in silent_runs(levels_db, silence_db, max(1, int(min_silence_ms // window_ms))):
+        # No padding is needed against the very start or end of the file
+        start = start + padding if start > 0 else start
+        end = end - padding if end < n_windows else end
+        if end <= start:
+            continue
+        if start > position:
+            regions.append((position, start))
+        position = end
+    if position < n_windows:
+        regions.append((position, n_windows))
+
+    boundaries = []
+    for region_start, region_end in regions:
+        start = region_start
+        while region_end - start > target:
+            search_from = start + target - tolerance
+            window = levels_db[search_from:start + target + 1]
+            # Latest of the quietest windows, so segments stay as long as possible
+            cut = search_from + len(window) - 1 - int(np.argmin(window[::-1]))
+            boundaries.append((start, cut))
+            start = cut
+        boundaries.append((start, region_end))
+
+    return [(int(round(start * window_ms)), min(int(round(end * window_ms)), total_length_ms))
+            for start, end in boundaries]
+
+
+def plan_audio_boundaries(audio, target_ms, tolerance_ms=10000, silence_db=-45.0, min_silence_ms=2000, window_ms=10):
+    """Silence-aware segment plan for a decoded pydub AudioSegment (or a PCMFileAudio)"""
+    if hasattr(audio, "iter_samples"):
+        # Audio read from disk (PCMFileAudio) is analysed block by block; blocks
+        # are whole windows, so the levels match a single pass over everything
+        block_frames = max(1, audio.frame_rate * window_ms // 1000) * RMS_BLOCK_WINDOWS
+        levels_db = np.concatenate([np.empty(0, dtype=np.float32)] + [
+            frame_rms_db(block, audio.channels, audio.frame_rate, audio.max_possible_amplitude, window_ms)
+            for block in audio.iter_samples(block_frames)
+        ])
+    else:
+        levels_db = frame_rms_db(
+            samples_array(audio), audio.channels, audio.frame_rate, audio.max_possible_amplitude, window_ms
+        )
+    # Windows are a whole number of frames, so their exact length can differ slightly from window_ms
+    exact_window_ms = max(1, audio.frame_rate * window_ms // 1000) * 1000 / audio.frame_rate
+    return plan_boundaries(levels_db, exact_window_ms, len(audio), target_ms, tolerance_ms, silence_db, min_silence_ms)
+
+
+def best_excerpt(levels_db, window_ms, excerpt_ms, silence_db=-45.0):
+    """
+    Start (ms) of the excerpt_ms stretch with the most non-silent windows
+
+    Ties go to the earliest stretch. Used to pick a representative bit of
+    speech for previews.
+    """
+    span = max(1, int(excerpt_ms // window_ms))
+    if len(levels_db) <= span:
+        return 0
+    voiced = np.concatenate(([0], np.cumsum(levels_db >= silence_db)))
+    counts = voiced[span:] - voiced[:-span]
+    return int(round(int(np.argmax(counts)) * window_ms))
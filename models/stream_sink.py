@@ -0,0 +1,34 @@
+import os
+
+
+def write_audio_stream(chunks, destination, on_chunk=None):
+    """
+    Write audio chunks from the speech-to-speech generator as they arrive
+
+    Replaces the `audio_bytes += chunk` pattern, which copies the whole
+    response on every chunk and keeps it all in memory.
+
+    Args:
+        chunks: Iterable of bytes chunks (e.g. the SDK's convert() generator)
+        destination: File path, or any writable binary file object
+            (an open file, io.BytesIO, ...)
+        on_chunk: Optional callback(chunk, bytes_written_so_far) so downstream
+            consumers (playback, progress) can use the audio before it's complete
+
+    Returns:
+        Total number of bytes written
+    """
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, "wb") as f:
+            return write_audio_stream(chunks, f, on_chunk)
+
+    written = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        destination.write(chunk)
+        written += len(chunk)
+        if on_chunk:
+            on_chunk(chunk, written)
+    destination.flush()
+    return written
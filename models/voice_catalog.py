@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import threading
+from config import VOICE_CATALOG_PATH, VOICE_CATALOG_MAX_AGE_S
+
+LABEL_KEYS = ("accent", "description", "age", "gender", "use_case")
+
+
+class VoiceCatalog:
+    """
+    All voices on the account, persisted to a local JSON file
+
+    Lookups are served from memory (indexed by name, ID and label). A stale
+    catalog is still served while a background thread refreshes it, so only
+    the very first run on a machine waits for the API.
+    """
+
+    def __init__(self, path=VOICE_CATALOG_PATH, max_age_s=VOICE_CATALOG_MAX_AGE_S, client=None, page_size=100):
+        self.path = path
+        self.max_age_s = max_age_s
+        self.page_size = page_size
+        self._client = client
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self.voices = []
+        self.etag = None
+        self.fetched_at = 0
+        self._index([])
+        self.load()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from models.api_client import get_shared_client
+            self._client = get_shared_client()
+        return self._client
+
+    def _index(self, voices):
+        by_id = {v["voice_id"]: v for v in voices}
+        by_name = {v["name"].lower(): v for v in voices}
+        by_label = {}
+        for v in voices:
+            for key, value in (v.get("labels") or {}).items():
+                by_label.setdefault((key, str(value).lower()), []).append(v)
+        self.by_id, self.by_name, self.by_label = by_id, by_name, by_label
+
+    def load(self):
+        """Load the persisted catalog, if any; returns True if one was found"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self.voices = data.get("voices", [])
+            self.etag = data.get("etag")
+            self.fetched_at = data.get("fetched_at", 0)
+            self._index(self.voices)
+        return True
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"etag": self.etag, "fetched_at": self.fetched_at, "voices": self.voices}, f, default=str)
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > self.max_age_s
+
+    def _fetch_page(self, next_page_token=None, etag=None):
+        request_options = {"additional_headers": {"If-None-Match": etag}} if etag else None
+        response = self.client.voices.with_raw_response.search(
+            page_size=self.page_size, sort="name", next_page_token=next_page_token, request_options=request_options,
+        )
+        return response.data, response.headers.get("etag")
+
+    def refresh(self):
+        """
+        Fetch every page of voices from the API and persist them
+
+        Returns:
+            True if the catalog changed, False if the server reported it unchanged
+        """
+        try:
+            page, etag = self._fetch_page(etag=self.etag if self.voices else None)
+        except Exception as e:
+            if getattr(e, "status_code", None) != 304:
+                raise
+            with self._lock:
+                self.fetched_at = time.time()
+                self._save()
+            return False
+
+        voices = []
+        while True:
+            voices.extend(voice.dict() for voice in page.voices)
+            if not page.has_more or not page.next_page_token:
+                break
+            page, _ = self._fetch_page(next_page_token=page.next_page_token)
+
+        with self._lock:
+            self.voices = voices
+            self.etag = etag
+            self.fetched_at = time.time()
+            self._index(voices)
+            self._save()
+        return True
+
+    def refresh_in_background(self):
+        """Start a refresh thread unless one is already running"""
+        with self._lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._background_refresh, daemon=True)
+            self._refresh_thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Background voice catalog refresh failed: {e}")
+
+    def ensure_fresh(self):
+        """Fetch synchronously only when nothing is cached; otherwise refresh in the background if stale"""
+        if not self.voices:
+            self.refresh()
+        elif self.is_stale():
+            self.refresh_in_background()
+
+    def get(self, name_or_id):
+        """Voice dict by ID or (case-insensitive) name, or None"""
+        return self.by_id.get(name_or_id) or self.by_name.get(str(name_or_id).lower())
+
+    def find(self, **labels):
+        """Voices whose labels match every given key=value, e.g. find(gender="female", accent="british")"""
+        matches = None
+        for key, value in labels.items():
+            ids = {v["voice_id"] for v in self.by_label.get((key, str(value).lower()), [])}
+            matches = ids if matches is None else matches & ids
+        return [self.by_id[i] for i in sorted(matches or [])]
+
+    def voice_options(self, price_for_category):
+        """Voices in the {name: {id, preview_url, labels..., price_per_min}} shape the UI uses"""
+        options = {}
+        for voice in self.voices:
+            labels = voice.get("labels") or {}
+            option = {"id": voice.get("voice_id", ""), "preview_url": voice.get("preview_url", "") or ""}
+            option.update({key: labels.get(key, "") for key in LABEL_KEYS})
+            option["price_per_min"] = price_for_category(voice.get("category") or "premium")
+            options[voice["name"]] = option
+        return options
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_voice_catalog():
+    """Process-wide voice catalog"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = VoiceCatalog()
+        return _catalog
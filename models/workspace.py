@@ -0,0 +1,175 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from config import JOB_WORK_DIR, DISK_QUOTA_BYTES
+
+# Per-job scratch directories live here; checkpoints of resumable jobs sit next to it in JOB_WORK_DIR
+WORKSPACE_ROOT = os.path.join(JOB_WORK_DIR, "runs")
+
+# Space reserved by admitted jobs that haven't finished: {workspace path: (workspace, bytes)}
+_reservations = {}
+_lock = threading.Lock()
+
+
+class DiskQuotaExceeded(Exception):
+    """Raised when a job's estimated scratch space doesn't fit in the disk quota"""
+
+
+def directory_size(path):
+    """Total size in bytes of the files under path (0 if it doesn't exist), counting hard links once"""
+    total = 0
+    seen = set()
+    for dir_path, _, file_names in os.walk(path):
+        for name in file_names:
+            try:
+                stat = os.stat(os.path.join(dir_path, name))
+            except OSError:
+                continue  # Removed while walking
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+class Workspace:
+    """
+    Scratch directory owning every intermediate file of one job
+
+    The upload, extracted and decoded audio, downloaded segments, and the
+    outputs all go inside it, so reclaiming the job's disk space is a
+    single cleanup() whether the job succeeded, failed or was cancelled.
+    """
+
+    def __init__(self, name=None, root=None):
+        self.name = name or uuid.uuid4().hex[:12]
+        self.path = os.path.join(root or WORKSPACE_ROOT, self.name)
+        os.makedirs(self.path, exist_ok=True)
+
+    def file_path(self, name):
+        """Path for a file called name inside the workspace"""
+        return os.path.join(self.path, os.path.basename(name))
+
+    def temp_path(self, suffix=""):
+        """Path of a new, empty, uniquely named file inside the workspace"""
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.path)
+        os.close(fd)
+        return path
+
+    def write_stream(self, name, source, chunk_size=1024 * 1024):
+        """Copy a file-like object into the workspace chunk by chunk and return the new path"""
+        path = self.file_path(name)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(source, f, chunk_size)
+        return path
+
+    def add_file(self, source_path):
+        """Hard-link (or, across file systems, copy) a file into the workspace and return the new path"""
+        path = self.file_path(source_path)
+        try:
+            os.link(source_path, path)
+        except OSError:
+            shutil.copyfile(source_path, path)
+        return path
+
+    def size(self):
+        return directory_size(self.path)
+
+    def reserve(self, estimate_bytes, quota_bytes=None):
+        """
+        Admit the job if its estimated scratch space fits in the disk quota
+
+        Everything already in JOB_WORK_DIR counts, plus what other admitted
+        jobs reserved and haven't written yet. The reservation lasts until
+        cleanup().
+
+        Raises:
+            DiskQuotaExceeded: if it doesn't fit
+        """
+        quota_bytes = DISK_QUOTA_BYTES if quota_bytes is None else quota_bytes
+        with _lock:
+            if quota_bytes:
+                used = directory_size(JOB_WORK_DIR)
+                used += sum(max(0, reserved - workspace.size()) for workspace, reserved in _reservations.values())
+                if used + estimate_bytes > quota_bytes:
+                    raise DiskQuotaExceeded(
+                        f"Not enough scratch space: the job needs about {estimate_bytes / 2**20:.0f} MB and "
+                        f"{max(0, quota_bytes - used) / 2**20:.0f} MB of the {quota_bytes / 2**20:.0f} MB quota "
+                        "is free. Try again once running jobs have finished."
+                    )
+            _reservations[self.path] = (self, estimate_bytes)
+
+    def release(self):
+        """Drop the reservation, e.g. once the files it was for are written"""
+        with _lock:
+            _reservations.pop(self.path, None)
+
+    def cleanup(self, keep=()):
+        """
+        Delete everything in the workspace except the paths in keep, and
+        release its reservation; the directory goes too if nothing is kept
+
+        Returns:
+            Bytes freed
+        """
+        keep = {os.path.abspath(path) for path in keep if path}
+        freed = 0
+        for dir_path, _, file_names in os.walk(self.path, topdown=False):
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                if os.path.abspath(path) in keep:
+                    continue
+                try:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    pass
+            if dir_path != self.path and not os.listdir(dir_path):
+                os.rmdir(dir_path)
+        if not keep:
+            shutil.rmtree(self.path, ignore_errors=True)
+        self.release()
+        return freed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+
+def prune_stale(workspace_max_age_s, checkpoint_max_age_s):
+    """
+    Remove leftovers of earlier processes: workspaces not touched for
+    workspace_max_age_s, and checkpoints of failed jobs (that were never
+    resumed) not touched for checkpoint_max_age_s. Workspaces with a
+    reservation are always kept.
+
+    Returns:
+        Bytes freed
+    """
+    if not os.path.isdir(JOB_WORK_DIR):
+        return 0
+    now = time.time()
+    with _lock:
+        active = set(_reservations)
+    candidates = [(os.path.join(JOB_WORK_DIR, name), checkpoint_max_age_s) for name in os.listdir(JOB_WORK_DIR)
+                  if name != os.path.basename(WORKSPACE_ROOT)]
+    if os.path.isdir(WORKSPACE_ROOT):
+        candidates += [(os.path.join(WORKSPACE_ROOT, name), workspace_max_age_s) for name in os.listdir(WORKSPACE_ROOT)]
+    freed = 0
+    for path, max_age_s in candidates:
+        if path in active or not os.path.isdir(path):
+            continue
+        try:
+            # Newest mtime of the directory and its files: checkpoints are rewritten as segments finish
+            last_used = max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(path, name))
+                                                         for name in os.listdir(path)])
+        except OSError:
+            continue
+        if now - last_used > max_age_s:
+            freed += directory_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+    return freed
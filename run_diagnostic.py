@@ -2,9 +2,6 @@
 import os
 import sys
 from voice_changer import VoiceChanger
-from io import BytesIO
-import requests
-import tempfile
 
 def run_diagnostic():
     """Run a diagnostic check on the ElevenLabs API integration using VoiceChanger"""
@@ -1,10 +1,14 @@
 import streamlit as st
-import tempfile
 import os
 import time
-from controllers import voice_changer_controller
+import functools
+from controllers import voice_changer_controller, job_runner
 from voice_changer import VoiceChanger
-from models.media_processor import is_video_file, extract_audio_from_video
+from models.media_processor import is_video_file
+from models.media_probe import probe_duration_ms
+from models.job_timing import JobTimer
+from models.workspace import Workspace, DiskQuotaExceeded
+from models.admission import get_admission_controller, AdmissionRejected
 from config import MAX_SEGMENT_DURATION_MS  # Import configuration values
 
 st.title("Eleven Labs Voice Changer")
@@ -17,46 +21,73 @@ voice_changer = VoiceChanger()
 uploaded_file = st.file_uploader("Choose an audio or video file", 
                                 type=["wav", "mp3", "mp4", "avi", "mov", "mkv", "flv", "wmv"])
 
-# Get voice options from Eleven Labs API
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def get_voices():
-    with st.spinner("Loading available voices..."):
-        return voice_changer.get_available_voices()
-
-voice_options = get_voices()
+# Get voice options from the local voice catalog (refreshed from the API in the background)
+with st.spinner("Loading available voices..."):
+    voice_options = voice_changer.get_available_voices()
 selected_voice_name = st.selectbox("Select Voice", [f"{voice} ({voice_options[voice]['accent']} - {voice_options[voice]['description']} - {voice_options[voice]['age']} - {voice_options[voice]['gender']} - {voice_options[voice]['use_case']})" for voice in voice_options.keys()])
 selected_voice = voice_options[selected_voice_name.split("(")[0].strip()]
 
+# Extra voices are converted in the same job, so the file is only decoded and segmented once
+compare_voice_names = st.multiselect(
+    "Also convert into (to compare voices)",
+    [voice for voice in voice_options.keys() if voice_options[voice]["id"] != selected_voice["id"]],
+)
+
 # Show voice preview if available
 if selected_voice.get("preview_url"):
     st.audio(selected_voice["preview_url"])
 
 st.markdown("### Processed Media Preview")
 
+
+def stage_upload(uploaded_file):
+    """Stream the upload into a workspace of its own, once per file rather than on every rerun"""
+    key = getattr(uploaded_file, "file_id", None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    staged = st.session_state.get("upload")
+    if staged and staged["key"] == key and os.path.exists(staged["path"]):
+        return staged["path"]
+    if staged:
+        staged["workspace"].cleanup()
+        del st.session_state["upload"]
+    workspace = Workspace()
+    try:
+        workspace.reserve(uploaded_file.size)
+        uploaded_file.seek(0)
+        path = workspace.write_stream(uploaded_file.name, uploaded_file)
+    except Exception:
+        workspace.cleanup()
+        raise
+    workspace.release()
+    st.session_state["upload"] = {"key": key, "workspace": workspace, "path": path}
+    return path
+
+
+input_path = None
 if uploaded_file:
-    # Save uploaded file to temporary file
-    temp_dir = tempfile.TemporaryDirectory()
-    input_path = os.path.join(temp_dir.name, uploaded_file.name)
-    with open(input_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    try:
+        input_path = stage_upload(uploaded_file)
+    except DiskQuotaExceeded as e:
+        st.error(str(e))
+elif "upload" in st.session_state:
+    # The file was removed from the uploader
+    st.session_state.pop("upload")["workspace"].cleanup()
+
+if input_path:
     # Check if it's a video file
     is_video = is_video_file(input_path)
     # Display the uploaded file
     if is_video:
         st.video(input_path)
-        # Extract audio for duration calculation
-        audio_path = extract_audio_from_video(input_path)
-        from pydub import AudioSegment
-        audio = AudioSegment.from_file(audio_path)
-        if os.path.exists(audio_path):
-            os.remove(audio_path)  # Clean up
     else:
         st.audio(input_path)
-        from pydub import AudioSegment
-        audio = AudioSegment.from_file(input_path)
+    
+    # Read the duration from the container headers instead of decoding the file
+    probe_start = time.perf_counter()
+    duration_ms = probe_duration_ms(input_path)
+    probe_seconds = time.perf_counter() - probe_start
     
     # Calculate cost preview using configuration
-    duration_minutes = len(audio) / 60000
+    duration_minutes = duration_ms / 60000
     # Use the calculate_cost method from VoiceChanger which should use config values
     estimated_cost = voice_changer.calculate_cost(duration_minutes, selected_voice.get("price_per_min", None))
     
@@ -65,38 +96,137 @@ if uploaded_file:
     st.markdown(f"- Duration: {duration_minutes:.2f} minutes")
     st.markdown(f"- Estimated Cost: ${estimated_cost}")
     
+    # What the account and the spending budgets still allow, after what running jobs reserved;
+    # the quota is read in the background, so the page never waits for it
+    available = get_admission_controller().available()
+    if available["minutes"] is not None:
+        st.markdown(f"- Remaining quota: {available['minutes']:.1f} minutes")
+    elif available["quota_pending"]:
+        st.markdown("- Remaining quota: checking...")
+    if available["day_budget"] is not None:
+        st.markdown(f"- Left of today's budget: ${available['day_budget']:.2f}")
+    if available["minutes"] is not None and available["minutes"] < duration_minutes:
+        st.warning("The remaining quota doesn't cover the whole file; only part of it will be converted, "
+                   "and a later run can pick up the rest")
+    
     # Calculate number of chunks based on config value, not hardcoded 240000
-    num_chunks = (len(audio) + MAX_SEGMENT_DURATION_MS - 1) // MAX_SEGMENT_DURATION_MS
+    num_chunks = (duration_ms + MAX_SEGMENT_DURATION_MS - 1) // MAX_SEGMENT_DURATION_MS
     st.markdown(f"- File will be processed in {num_chunks} chunk(s) of {MAX_SEGMENT_DURATION_MS/60000:.1f} minutes or less")
     
+    selected_voices = {selected_voice_name.split("(")[0].strip(): selected_voice}
+    selected_voices.update({name: voice_options[name] for name in compare_voice_names})
+    
+    # Convert a short speech-dense excerpt first, so voices can be judged before paying for the whole file
+    if st.button("Preview on my audio"):
+        # st.audio reads the files when called, so the preview's files are removed right after
+        with Workspace() as preview_space:
+            try:
+                with st.spinner("Converting a short excerpt..."):
+                    preview = voice_changer_controller.preview_voices(input_path, list(selected_voices.values()),
+                                                                      work_dir=preview_space.path)
+                st.markdown(f"#### Original excerpt ({preview['start_ms'] / 1000:.1f}s - {preview['end_ms'] / 1000:.1f}s)")
+                st.audio(preview["excerpt"])
+                for name, voice in selected_voices.items():
+                    result = preview["voices"][voice["id"]]
+                    st.markdown(f"#### {name} (${result['cost']})")
+                    if result["error"]:
+                        st.error(f"Error during preview: {result['error']}")
+                    else:
+                        st.audio(result["output"])
+            except Exception as e:
+                st.error(f"Error during preview: {str(e)}")
+    
     if st.button("Change Voice"):
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Process the voice change
-        status_text.text("Processing audio chunks...")
-        
+        # The job runs in the background, so it keeps going across reruns and
+        # doesn't hold up other sessions; its progress is shown below
+        timer = JobTimer()
+        timer.record("probe", probe_seconds, os.path.getsize(input_path), duration_ms)
         try:
-            with st.spinner("Processing... This may take a while for large files"):
-                start_time = time.time()
-                output_path, total_cost = voice_changer_controller.process_voice_change(input_path, selected_voice)
-                processing_time = time.time() - start_time
-            
-            progress_bar.progress(100)
-            status_text.text(f"Processing complete! Time taken: {processing_time:.2f} seconds")
-            
-            st.success(f"Voice changed! Total cost: ${total_cost}")
-            
-            # Display the processed file
-            if is_video_file(output_path):
-                st.video(output_path)
-            else:
-                st.audio(output_path)
-                
-            # Provide download option
-            with open(output_path, "rb") as f:
-                st.download_button("Download Changed Media", f, file_name=os.path.basename(output_path))
-        except Exception as e:
-            progress_bar.progress(100)
-            st.error(f"Error during voice changing: {str(e)}")
-            status_text.text("Processing failed. Please check your API key and try again.")
+            job_id = job_runner.submit_job(input_path, list(selected_voices.values()), timer=timer)
+            st.session_state.setdefault("job_ids", []).insert(0, job_id)
+        except (DiskQuotaExceeded, AdmissionRejected) as e:
+            st.error(str(e))
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def show_job(job, voice_names):
+    """Render one job's progress or results; returns True while it's still running"""
+    names = ", ".join(voice_names.get(voice_id, voice_id) for voice_id in job["voice_ids"])
+    st.markdown(f"#### {os.path.basename(job['input'])} -> {names}")
+    if job["state"] in ("queued", "running"):
+        if job["cancel_requested"]:
+            st.info("Cancelling... waiting for the requests already sent")
+        elif job["state"] == "queued":
+            st.info("Waiting for a free job slot...")
+        elif job["total"]:
+            eta = f", about {job['eta_s']:.0f} s left" if job["eta_s"] is not None else ""
+            st.progress(job["finished"] / job["total"],
+                        text=f"{job['finished']} of {job['total']} segments converted, "
+                             f"{job['upload_bytes'] / 1e6:.1f} MB uploaded{eta}")
+        if job["messages"]:
+            st.caption(job["messages"][-1][1])
+        if not job["cancel_requested"] and st.button("Cancel", key=f"cancel_{job['id']}"):
+            job_runner.cancel_job(job["id"])
+        return True
+
+    results = job["results"] or {}
+    processing_time = (job["finished_at"] or 0) - job["submitted_at"]
+    if job["state"] in ("cancelled", "rejected"):
+        st.warning(job["error"])
+    elif job["state"] == "failed":
+        st.error(f"Error during voice changing: {job['error']}")
+        st.caption("Processing failed. Please check your API key and try again.")
+    else:
+        st.success(f"Voice changed in {processing_time:.2f} seconds! "
+                   f"Total cost: ${round(sum(r['cost'] for r in results.values()), 2)}")
+
+    for voice_id, result in results.items():
+        name = voice_names.get(voice_id, voice_id)
+        if len(results) > 1:
+            st.markdown(f"##### {name} (${result['cost']})")
+        if result["error"]:
+            if job["state"] == "partial":
+                st.error(f"Error during voice changing: {result['error']}")
+            continue
+        output_path = result["output"]
+
+        # Display the processed file
+        if is_video_file(output_path):
+            st.video(output_path)
+        else:
+            st.audio(output_path)
+
+        # Provide download option; the file is only read when the button is clicked
+        st.download_button("Download Changed Media" + (f" ({name})" if len(results) > 1 else ""),
+                           functools.partial(read_file, output_path), file_name=os.path.basename(output_path),
+                           key=f"download_{job['id']}_{voice_id}")
+
+    # Where the time went; segments run concurrently, so stages can add up to more than the wall time
+    timer = job["timer"]
+    if timer.spans:
+        with st.expander(f"Time breakdown ({timer.wall_seconds or 0:.1f} s wall time)"):
+            st.table(timer.breakdown())
+    return False
+
+
+@st.fragment(run_every=1)
+def poll_job(job_id, voice_names):
+    """Refresh a running job's progress every second on its own; the page reruns once, when it finishes"""
+    job = job_runner.get_job(job_id)
+    if job and not show_job(job, voice_names):
+        st.rerun()
+
+
+# Jobs started from this session, newest first. Only running jobs are polled,
+# so finished ones (and their media) aren't re-rendered every second
+voice_names = {voice["id"]: name for name, voice in voice_options.items()}
+for job_id in st.session_state.get("job_ids", []):
+    job = job_runner.get_job(job_id)
+    if job and job["finished_at"]:
+        show_job(job, voice_names)
+    elif job:
+        poll_job(job_id, voice_names)
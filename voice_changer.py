@@ -1,20 +1,49 @@
 import os
 from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
-import requests
 from io import BytesIO
 import tempfile
 import math
-from config import ELEVEN_LABS_API_KEY, ELEVEN_LABS_API_URL, DEFAULT_VOICE_PRICE_PER_MIN
+import time
+from models.stream_sink import write_audio_stream
+from models.conversion_cache import conversion_cache_key, get_default_cache
+from models.resilient_client import ResilientClient
+from models.api_client import get_shared_client, get_requests_session
+from models.voice_catalog import get_voice_catalog
+from models.job_timing import ReadTracker
+from config import ELEVEN_LABS_API_KEY, ELEVEN_LABS_API_URL, DEFAULT_VOICE_PRICE_PER_MIN, API_TIMEOUT_S
 
 class VoiceChanger:
-    def __init__(self):
+    def __init__(self, client=None, cache=None):
+        """
+        Args:
+            client: Optional pre-built ElevenLabs client (or a compatible fake
+                exposing speech_to_speech.convert), wrapped in a ResilientClient
+                unless it already is one. Defaults to the process-wide shared
+                client, which is only built on first use
+            cache: Optional ConversionCache; defaults to the shared cache from config
+                (pass False to disable caching)
+        """
         self.api_key = ELEVEN_LABS_API_KEY
         self.api_url = ELEVEN_LABS_API_URL
-        if not self.api_key:
-            raise ValueError("ELEVENLABS_API_KEY not found in environment variables or config")
-        self.client = ElevenLabs(api_key=self.api_key)
+        self.cache = get_default_cache() if cache is None else (cache or None)
+        # Rate limiting, retries and circuit breaking around speech-to-speech
+        if client is not None and not isinstance(client, ResilientClient):
+            client = ResilientClient(client)
+        self._client = client
+    
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_shared_client()
+        return self._client
         
+    def get_metrics(self):
+        """Retry/throttle metrics of the API client (None until it's built) and the cache's hit/miss counters"""
+        return {
+            "api": self._client.get_metrics() if self._client is not None else None,
+            "cache": self.cache.stats() if self.cache else None,
+        }
+
     def validate_connection(self):
         """Validate the API connection and key"""
         try:
@@ -36,20 +65,12 @@ class VoiceChanger:
     def get_available_voices(self):
         """Get comprehensive list of available voices with detailed metadata"""
         try:
-            voices = self.client.voices.search(page_size=100, sort="name")
-            
-            voice_options = {}
-            for voice in voices.dict().get("voices", []):
-                voice_options[voice["name"]] = {
-                    "id": voice.get("voice_id", ""),
-                    "preview_url": voice.get("preview_url", ""),
-                    "accent": voice.get("labels", {}).get("accent", ""),
-                    "description": voice.get("labels", {}).get("description", ""),
-                    "age": voice.get("labels", {}).get("age", ""),
-                    "gender": voice.get("labels", {}).get("gender", ""),
-                    "use_case": voice.get("labels", {}).get("use_case", ""),
-                    "price_per_min": self.get_voice_price(getattr(voice, "category", "premium"))
-                }
+            # Served from the local catalog; only an empty catalog waits on the API
+            catalog = get_voice_catalog()
+            catalog.ensure_fresh()
+            voice_options = catalog.voice_options(self.get_voice_price)
+            if not voice_options:
+                raise ValueError("No voices found on this account")
             return voice_options
         except Exception as e:
             print(f"Error fetching voices: {e}")
@@ -80,15 +101,25 @@ class VoiceChanger:
             price_per_min = DEFAULT_VOICE_PRICE_PER_MIN
         return round(duration_minutes * price_per_min, 2)
     
-    def change_voice(self, input_audio_path=None, input_audio_url=None, voice_id="JBFqnCBsd6RMkjVDRZzb", model_id="eleven_multilingual_sts_v2"):
+    def change_voice(self, input_audio_path=None, input_audio_url=None, voice_id="JBFqnCBsd6RMkjVDRZzb", model_id="eleven_multilingual_sts_v2", input_audio_data=None, on_chunk=None, output_format="mp3_44100_128", timer=None, segment=None, work_dir=None, before_api_call=None):
         """
         Change the voice in an audio file
         
         Args:
             input_audio_path: Path to local audio file
             input_audio_url: URL to audio file
+            input_audio_data: In-memory audio (bytes, memoryview or file-like object)
             voice_id: Target voice ID
             model_id: Model to use for conversion
+            on_chunk: Optional callback(chunk, bytes_written) invoked as response audio arrives
+            output_format: Output format requested from the API
+            timer: Optional JobTimer that gets upload, server and download spans
+            segment: Segment index recorded with those spans
+            work_dir: Directory for the output file (default: the system temp directory)
+            before_api_call: Optional callable run when the result isn't cached, just
+                before the request is sent; if it returns False, nothing is sent.
+                Results served from the cache never call it, so it's where callers
+                reserve or count what the API is actually used for
             
         Returns:
             (success, result) where:
@@ -98,14 +129,26 @@ class VoiceChanger:
         try:
             # Get audio data
             audio_data = None
-            if input_audio_path and os.path.exists(input_audio_path):
+            if input_audio_data is not None:
+                if isinstance(input_audio_data, (bytes, bytearray, memoryview)):
+                    audio_data = BytesIO(input_audio_data)
+                    audio_data.name = "segment.wav"
+                elif hasattr(input_audio_data, "getvalue"):
+                    # Fresh reader over the same bytes so every attempt starts at offset 0
+                    audio_data = BytesIO(input_audio_data.getvalue())
+                    audio_data.name = getattr(input_audio_data, "name", "segment.wav")
+                else:
+                    input_audio_data.seek(0)
+                    audio_data = BytesIO(input_audio_data.read())
+                    audio_data.name = os.path.basename(getattr(input_audio_data, "name", "segment.wav"))
+            elif input_audio_path and os.path.exists(input_audio_path):
                 # For local files, read them as binary and create a BytesIO object
                 with open(input_audio_path, 'rb') as f:
                     file_data = f.read()
                     audio_data = BytesIO(file_data)
                     audio_data.name = os.path.basename(input_audio_path)  # Add name attribute
             elif input_audio_url:
-                response = requests.get(input_audio_url)
+                response = get_requests_session().get(input_audio_url, timeout=API_TIMEOUT_S)
                 if response.status_code == 200:
                     audio_data = BytesIO(response.content)
                     audio_data.name = "audio_from_url.mp3"  # Add name attribute
@@ -114,26 +157,64 @@ class VoiceChanger:
             else:
                 return False, "No input audio provided"
             
+            # Serve repeated conversions of identical audio from the cache
+            cache_key = None
+            if self.cache:
+                with audio_data.getbuffer() as audio_view:
+                    cache_key = conversion_cache_key(audio_view, voice_id, model_id, output_format)
+                cached_path = self.cache.get(cache_key, dir=work_dir)
+                if cached_path:
+                    return True, cached_path
+            if before_api_call is not None and not before_api_call():
+                return False, "Not sent: no quota or budget left for it"
+            
             # Convert audio using speech-to-speech API
             try:
+                upload = ReadTracker(audio_data) if timer else audio_data
+                first_chunk_at = []
+
+                def chunk_received(chunk, bytes_written):
+                    if not first_chunk_at:
+                        first_chunk_at.append(time.perf_counter())
+                    if on_chunk:
+                        on_chunk(chunk, bytes_written)
+
                 # Get the generator from the API
                 audio_stream_generator = self.client.speech_to_speech.convert(
-                    voice_id="IES4nrmZdUBHByLBde0P",
-                    audio=audio_data,
+                    voice_id=voice_id,
+                    audio=upload,
                     model_id=model_id,
-                    output_format="mp3_44100_128",
+                    output_format=output_format,
                 )
                 
-                # Convert generator to bytes by concatenating all chunks
-                audio_bytes = b''
-                for chunk in audio_stream_generator:
-                    audio_bytes += chunk
-                
-                # Save the audio to a temporary file that can be played by the GUI
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-                temp_file.write(audio_bytes)
+                # Stream chunks straight into a temporary file that can be played by the GUI
+                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3", dir=work_dir)
                 temp_file_path = temp_file.name
-                temp_file.close()
+                started_at = time.perf_counter()
+                try:
+                    with temp_file:
+                        bytes_received = write_audio_stream(audio_stream_generator, temp_file, chunk_received)
+                except Exception:
+                    os.remove(temp_file_path)
+                    raise
+                
+                if timer:
+                    # Upload ends when the request body was fully read (rate-limit waits count as upload),
+                    # server time runs until the first response chunk, download until the last one
+                    finished_at = time.perf_counter()
+                    first_at = first_chunk_at[0] if first_chunk_at else finished_at
+                    sent_at = min(upload.finished_at or first_at, first_at)
+                    timer.record("upload", sent_at - started_at, upload.size, segment=segment, start=started_at,
+                                 voice_id=voice_id)
+                    timer.record("server", first_at - sent_at, segment=segment, start=sent_at, voice_id=voice_id)
+                    timer.record("download", finished_at - first_at, bytes_received, segment=segment,
+                                 start=first_at, voice_id=voice_id)
+                
+                if cache_key:
+                    try:
+                        self.cache.put(cache_key, temp_file_path)
+                    except OSError as cache_error:
+                        print(f"Could not cache converted segment: {cache_error}")
                 
                 return True, temp_file_path
             except Exception as api_error: